@@ -10,3 +10,53 @@ GROCY_ENDPOINT = os.environ.get("GROCY_BASE_URL")
 API_PORT = 9193
 API_KEYS = os.environ.get("API_KEYS", "").split("\n")
 LOG_LEVEL = logging.INFO
+
+# HTTP connection pooling
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", 4))
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 10))
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", 30))
+
+# Grocy master data cache (products, units, conversions)
+GROCY_CACHE_TTL = float(os.environ.get("GROCY_CACHE_TTL", 900))
+GROCY_CACHE_MAX_ENTRIES = int(os.environ.get("GROCY_CACHE_MAX_ENTRIES", 32))
+GROCY_CACHE_REVALIDATE_INTERVAL = float(os.environ.get("GROCY_CACHE_REVALIDATE_INTERVAL", 2))
+
+# Number of concurrent requests when loading the data for a sync
+SYNC_FETCH_WORKERS = int(os.environ.get("SYNC_FETCH_WORKERS", 6))
+
+# Pagination of mealie collections
+MEALIE_PAGE_SIZE = int(os.environ.get("MEALIE_PAGE_SIZE", 500))
+MEALIE_PAGE_PREFETCH = int(os.environ.get("MEALIE_PAGE_PREFETCH", 2))
+
+# Recipes of the meal plan
+RECIPE_CACHE_SIZE = int(os.environ.get("RECIPE_CACHE_SIZE", 128))
+RECIPE_FETCH_WORKERS = int(os.environ.get("RECIPE_FETCH_WORKERS", 6))
+
+# Creation of mealie foods from grocy products
+FOOD_IMPORT_WORKERS = int(os.environ.get("FOOD_IMPORT_WORKERS", 4))
+FOOD_IMPORT_RETRIES = int(os.environ.get("FOOD_IMPORT_RETRIES", 3))
+
+# Check-off or deletion of mealie shopping list items in batches
+MEALIE_BULK_BATCH_SIZE = int(os.environ.get("MEALIE_BULK_BATCH_SIZE", 50))
+MEALIE_BULK_WORKERS = int(os.environ.get("MEALIE_BULK_WORKERS", 4))
+
+# What happens to mealie shopping list items after they were transferred to grocy: "check", "delete" or "none"
+MEALIE_SHOPPING_LIST_CLEANUP = os.environ.get("MEALIE_SHOPPING_LIST_CLEANUP") or "none"
+
+# Concurrent writes to the grocy shopping list
+SHOPPING_LIST_WRITE_WORKERS = int(os.environ.get("SHOPPING_LIST_WRITE_WORKERS", 4))
+
+# Maximum number of notes kept in the description of the grocy shopping list, 0 keeps all
+SHOPPING_LIST_MAX_NOTES = int(os.environ.get("SHOPPING_LIST_MAX_NOTES", 0))
+
+# Local state (product hashes, sync state), /data is the persistent add-on directory
+STATE_DB_PATH = os.environ.get("STATE_DB_PATH", "/data/mealie2grocy.sqlite" if os.path.isdir("/data") else "mealie2grocy.sqlite")
+
+# Background jobs hold a lease in the state database while they run, it expires if a worker dies
+JOB_LEASE_TTL = float(os.environ.get("JOB_LEASE_TTL", 60))
+
+# Minutes between automatic shopping list syncs, 0 disables them
+SYNC_INTERVAL = float(os.environ.get("SYNC_INTERVAL") or 0)
+
+# Seconds without new webhook events before the collected events are synced
+WEBHOOK_DEBOUNCE = float(os.environ.get("WEBHOOK_DEBOUNCE", 5))
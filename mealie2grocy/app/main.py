@@ -1,15 +1,53 @@
+import atexit
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from services.grocy_service import GrocyInstance
 from services.mealie_service import MealieInstance
+from services.debouncer import Debouncer
+from services.fuzzy_matcher import FuzzyMatcher
+from services.product_diff import ProductDiff
+from services.product_matcher import ProductMatcher
+from services.job_runner import JobRunner, JobProgress, FAILED
+from services.parallel_writer import ParallelWriter, WriteResult
+from services.product_sync import IncrementalProductSync
+from services.scheduler import PeriodicScheduler
+from services.shopping_list_state import ShoppingListChanges
+from services.shopping_list_planner import ShoppingListPlan, ShoppingListOperation, plan_shopping_list, INSERT, UPDATE, MIN_AMOUNT
+from services.state_store import StateStore
 from services.unit_converter import UnitConverter
+from services.webhook import FULL_SYNC
+from models.grocy import GrocyShoppingListItem
 from models.ingredient import Ingredient
-from config import GROCY_API_KEY, GROCY_ENDPOINT, MEALIE_ENDPOINT, MEALIE_API_KEY
+from config import GROCY_API_KEY, GROCY_ENDPOINT, MEALIE_ENDPOINT, MEALIE_API_KEY, SYNC_FETCH_WORKERS, STATE_DB_PATH, \
+    SHOPPING_LIST_WRITE_WORKERS, MEALIE_SHOPPING_LIST_CLEANUP, JOB_LEASE_TTL, SYNC_INTERVAL, WEBHOOK_DEBOUNCE
 
 from flask_babel import _
 
 grocy = GrocyInstance(GROCY_API_KEY, GROCY_ENDPOINT)
 mealie = MealieInstance(MEALIE_API_KEY, MEALIE_ENDPOINT)
+grocy.http.ensure_pool_maxsize(SHOPPING_LIST_WRITE_WORKERS)
+
+SYNC_STATE_KEY = "shoppinglist_sync_state"
+
+_state_store: StateStore | None = None
+_job_runner: JobRunner | None = None
+_webhook_debouncer: Debouncer | None = None
+
+
+def get_state_store() -> StateStore:
+    global _state_store
+    if _state_store is None:
+        _state_store = StateStore(STATE_DB_PATH)
+    return _state_store
+
+
+def get_job_runner() -> JobRunner:
+    global _job_runner
+    if _job_runner is None:
+        _job_runner = JobRunner(get_state_store(), JOB_LEASE_TTL)
+    return _job_runner
 
 
 def test_grocy_connection():
@@ -20,83 +58,129 @@ def test_mealie_connection():
     return mealie.test_connection()
 
 
-def update_products_in_mealie():
+def update_products_in_mealie(incremental: bool = False):
+    if incremental:
+        return IncrementalProductSync(grocy, mealie, get_state_store()).run()
+
     grocy_products = grocy.get_all_products()
     mealie_foods = mealie.get_all_foods()
 
-    mealie.create_food_items_from_grocy_products_if_not_present(grocy_products, mealie_foods)
-
-
-def update_grocy_shoppinglist_from_mealie():
+    return mealie.create_food_items_from_grocy_products_if_not_present(grocy_products, mealie_foods)
+
+
+def _get_grocy_shopping_list(clear_checked: bool = True):
+    if clear_checked:
+        grocy.clear_checked_items_on_shopping_list()
+    return grocy.get_shopping_list_items()
+
+
+def fetch_sync_inputs(clear_checked: bool = True, item_ids: set[str] | None = None) -> dict:
+    """
+    Load everything the shopping list sync needs. Independent requests run concurrently, so the
+    duration is that of the slowest fetch instead of the sum of all of them.
+    :param clear_checked: Remove checked items from the grocy shopping list, disabled for dry runs
+    :param item_ids: Only load these mealie shopping list items instead of the whole list
+    :return: Dict with grocy_products, mealie_foods, converter, ingredients, grocy_shopping_list and stock_items
+    """
+    tasks = {
+        "grocy_products": grocy.get_all_products,
+        "mealie_foods": mealie.get_all_foods,
+        "converter": lambda: UnitConverter(grocy, mealie),
+        "ingredients": mealie.get_shopping_list_ingredients if item_ids is None else lambda: mealie.get_shopping_list_ingredients_by_id(item_ids),
+        "grocy_shopping_list": lambda: _get_grocy_shopping_list(clear_checked),
+        "stock_items": grocy.get_stock_snapshot,
+    }
+
+    with ThreadPoolExecutor(max_workers=SYNC_FETCH_WORKERS, thread_name_prefix="sync-fetch") as executor:
+        futures = {name: executor.submit(task) for name, task in tasks.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def prepare_shopping_list_sync(inputs: dict, synced_items: dict[str, dict] | None = None, item_ids: set[str] | None = None) \
+        -> tuple[str, list[str], ShoppingListPlan, ShoppingListChanges]:
+    """
+    Decide what has to be written to grocy, without writing anything
+    :param inputs: Result of fetch_sync_inputs
+    :param synced_items: Items transferred by earlier syncs, only products with new or changed items are planned
+    :param item_ids: Mealie items the inputs were loaded for, None if they contain the whole mealie shopping list
+    :return: Result text, notes for unmatched ingredients, the plan for the grocy shopping list and the item changes
+    """
     result = ""
+    notes = []
+    missing = []
 
-    grocy_products = grocy.get_all_products()
+    grocy_products = inputs["grocy_products"]
+    converter: UnitConverter = inputs["converter"]
+    ingredients: list[Ingredient] = inputs["ingredients"]
+    grocy_shopping_list: list[GrocyShoppingListItem] = inputs["grocy_shopping_list"]
+    stock_items = inputs["stock_items"]
 
-    grocy.clear_checked_items_on_shopping_list()
+    # 2. Match ingredients with grocy products
+    matcher = ProductMatcher.for_catalog(grocy_products, inputs["mealie_foods"])
+    for ingredient in ingredients:
+        product = matcher.match(ingredient.name)
+        if product is not None:
+            ingredient.gid = product.id
 
-    converter = UnitConverter(grocy, mealie)
+    changes = ShoppingListChanges(ingredients, synced_items or {}, item_ids)
+    logging.info(f"Shopping list changes: {changes}")
+    pending_products = changes.pending_products
 
-    # 1. Get shopping list ingredients
-    ingredients = mealie.get_shopping_list_ingredients()
+    unmatched = [ingredient for ingredient in changes.pending if ingredient.gid is None]
+    fuzzy = FuzzyMatcher.for_catalog(grocy_products) if unmatched else None
 
-    # 2. Match ingredients with grocy products
-    for ingredient in ingredients:
-        for product in grocy_products:
-            if ingredient.name == product.name:
-                ingredient.gid = product.id
-                break
+    for ingredient in unmatched:
+        changes.record(ingredient)
+        logging.warning(f"Could not find product for ingredient: {ingredient.name}")
 
-        if ingredient.gid is None:
-            logging.warning(f"Could not find product for ingredient: {ingredient.name}")
-            note = ingredient.name
-            if ingredient.amount > 0:
-                note += ": " + str(ingredient.amount)
-                if ingredient.unit:
-                    note += " " + str(ingredient.unit)
+        suggestions = ", ".join(fuzzy.suggest_names(ingredient.name))
+        if suggestions:
+            result += f"{ingredient.name} {_("not found in Grocy. Did you mean")}: {suggestions}?\n"
 
-            grocy.add_note_to_shopping_list(note)
+        note = ingredient.name
+        if ingredient.amount > 0:
+            note += ": " + str(ingredient.amount)
+            if ingredient.unit:
+                note += " " + str(ingredient.unit)
 
-    # 4. Get existing grocy shopping list
-    ingredients_already_on_shopping_list = grocy.get_shopping_list_ingredients()
+        notes.append(note)
 
     # 5. Per ingredient
+    for stock_item in stock_items.values():
+        # Ignore opened items
+        stock_item.stock -= stock_item.stock_opened
+
+    converter.prefetch_product_conversions(pending_products)
+
+    # Products without new or changed items were already transferred
     converted_ingredients = []
-    stock_items = {}
     for ingredient in ingredients:
-        if ingredient.gid is None:
+        if ingredient.gid not in pending_products:
             continue
 
         # 5.0. Convert mealie units to grocy units if needed
-        stock_item = grocy.get_stock_product(ingredient.gid)
-        stock_items[ingredient.gid] = stock_item
-
-        # Ignore opened items
-        stock_item.stock -= stock_item.stock_opened
+        stock_item = stock_items[ingredient.gid]
 
         if stock_item.stock_unit != ingredient.unit:
             logging.info(f"Converting {ingredient.unit} to {stock_item.stock_unit}")
-            converted_ingredients.append(converter.convert(ingredient, stock_item))
+            converted = converter.convert(ingredient, stock_item)
         else:
-            converted_ingredients.append(ingredient)
+            converted = ingredient
+
+        converted_ingredients.append(converted)
+        changes.record(ingredient, converted)
 
     # Aggregate ingredients
-    to_remove = []
-    for i in range(len(converted_ingredients)):
-        for j in range(i + 1, len(converted_ingredients)):
-            ingredient1: Ingredient = converted_ingredients[i]
-            ingredient2: Ingredient = converted_ingredients[j]
-            if ingredient1.gid == ingredient2.gid and ingredient1.unit == ingredient2.unit:
-                ingredient1.add(ingredient2)
-                to_remove.append(j)
-
-    for i in sorted(to_remove, reverse=True):
-        converted_ingredients.pop(i)
-
-    for ingredient in converted_ingredients:
+    aggregated_ingredients = Ingredient.aggregate(converted_ingredients + changes.other_ingredients(pending_products))
+
+    amounts_already_on_shoppinglist = {}
+    for item in grocy_shopping_list:
+        amounts_already_on_shoppinglist[item.product_id] = amounts_already_on_shoppinglist.get(item.product_id, 0) + item.amount
+
+    for ingredient in aggregated_ingredients:
         stock_item = stock_items[ingredient.gid]
 
-        on_shoppinglist = ingredients_already_on_shopping_list.get(ingredient.gid)
-        amount_already_on_shoppinglist = on_shoppinglist.amount if on_shoppinglist else 0
+        amount_already_on_shoppinglist = amounts_already_on_shoppinglist.get(ingredient.gid, 0)
 
         amount_needed = 0
         if ingredient.amount > 0:
@@ -105,45 +189,282 @@ def update_grocy_shoppinglist_from_mealie():
             # Any amount is sufficient
             amount_needed = round(max(1 - amount_already_on_shoppinglist, 0), 2)
 
-        if amount_needed > 0.05:
+        missing.append((ingredient, amount_needed))
+
+        if amount_needed > MIN_AMOUNT:
             logging.info(f"Adding {amount_needed} {ingredient.name} to shopping list (required: {ingredient.amount}, stock: {stock_item.stock}, min stock: {stock_item.min_stock}, already on shopping list: {amount_already_on_shoppinglist})")
             result += f"{ingredient.name} {_("is added to the shopping list.")}\n"
-
-            if amount_already_on_shoppinglist > 0:
-                grocy.remove_from_shopping_list(ingredient.gid)
-                amount_needed += round(amount_already_on_shoppinglist, 2)
-
-            grocy.add_to_shopping_list(ingredient, amount_needed)
         else:
             logging.info(f"Stock is sufficient for {ingredient.name} (required: {ingredient.amount}, stock: {stock_item.stock}, min stock: {stock_item.min_stock}, already on shopping list: {amount_already_on_shoppinglist})")
             result += f"{ingredient.name} {_("is in stock or already on the list")} ({stock_item.stock} {stock_item.stock_unit})\n"
 
-    # mealie.clear_shoppinglist()
+    return result, notes, plan_shopping_list(missing, grocy_shopping_list), changes
+
+
+def apply_shopping_list_operation(operation: ShoppingListOperation):
+    if operation.action == INSERT:
+        grocy.add_to_shopping_list(operation.ingredient, operation.amount)
+    elif operation.action == UPDATE:
+        grocy.update_shopping_list_item(operation.item_id, operation.amount)
+
+
+def transferred_mealie_items(ingredients: list[Ingredient], written_keys: set) -> set[str]:
+    """
+    Ids of the mealie shopping list items that were written to grocy
+    :param ingredients: Mealie shopping list ingredients after matching
+    :param written_keys: Product ids that got an insert or update, "notes" if the notes were written
+    """
+    return {
+        ingredient.mid for ingredient in ingredients
+        if ingredient.mid is not None and (ingredient.gid if ingredient.gid is not None else "notes") in written_keys
+    }
+
+
+def record_synced_items(changes: ShoppingListChanges, plan: ShoppingListPlan, notes: list[str], failed_keys: set) -> set[str]:
+    """
+    Store the items that were processed, the next sync only processes items that are new or changed after this one.
+    Items whose write failed are not stored, so they are retried.
+    :param failed_keys: Product ids with a failed write, "notes" if the notes could not be written
+    :return: Ids of the mealie items that were written to grocy, now or by an earlier sync. They can be cleaned up in mealie.
+    """
+    written_keys = {operation.ingredient.gid for operation in plan.writes} - failed_keys
+    if notes and "notes" not in failed_keys:
+        written_keys.add("notes")
+
+    written = transferred_mealie_items(changes.pending, written_keys)
+
+    entries = {}
+    for mealie_id, entry in changes.entries.items():
+        key = entry["product_id"] if entry["product_id"] is not None else "notes"
+        if key in failed_keys:
+            continue
+
+        # A changed item that is in stock now still has the amount of an earlier sync on the grocy list
+        previously_written = changes.synced.get(mealie_id, {}).get("written", False)
+        entries[mealie_id] = {**entry, "written": mealie_id in written or previously_written}
+
+    get_state_store().update_shopping_list_items(entries, changes.removed)
+
+    # Cleanups of items that were written by an earlier sync may have failed back then
+    previously_written = {ingredient.mid for ingredient in changes.unchanged if changes.synced[ingredient.mid]["written"]}
+    return {mealie_id for mealie_id, entry in entries.items() if entry["written"]} | previously_written
+
+
+def clean_up_mealie_shoppinglist(item_ids: set[str]) -> str:
+    """
+    Check off or delete transferred items on the mealie shopping list, as configured by MEALIE_SHOPPING_LIST_CLEANUP
+    :return: Result text for items that could not be updated
+    """
+    if MEALIE_SHOPPING_LIST_CLEANUP == "none" or not item_ids:
+        return ""
+
+    try:
+        summary = mealie.update_shopping_list_items(item_ids, MEALIE_SHOPPING_LIST_CLEANUP)
+    except Exception as e:
+        logging.error(f"Failed to update mealie shopping list: {e}")
+        return f"{_("Mealie shopping list could not be updated")}: {e}\n"
+
+    if summary.failed:
+        return f"{_("Mealie shopping list could not be updated")}: {len(summary.failed)}/{len(item_ids)}\n"
+
+    return ""
+
+
+def update_grocy_shoppinglist_from_mealie(progress: JobProgress | None = None):
+    """
+    Transfer the mealie shopping list to grocy
+    :param progress: Receives the phases (fetching, planning, writing, cleanup) and every result line while the sync runs
+    """
+    return _update_grocy_shoppinglist(progress or JobProgress())[0]
+
+
+def _update_grocy_shoppinglist(progress: JobProgress, item_ids: set[str] | None = None) -> tuple[str, bool]:
+    """
+    :param item_ids: Only transfer these mealie shopping list items
+    :return: Result text and whether all writes succeeded
+    """
+
+    lines = []
+    lines_lock = threading.Lock()
 
-    if result == "":
-        result = _("Shopping list is up to date.")
+    def report(line: str):
+        # Write results are reported from the writer threads
+        with lines_lock:
+            lines.append(line)
+            progress.line(line)
+
+    # 1. Get shopping list ingredients, grocy catalog, stock and shopping list
+    progress.phase("fetching")
+    inputs = fetch_sync_inputs(item_ids=item_ids)
+
+    progress.phase("planning")
+    synced_items = get_state_store().get_shopping_list_items()
+    result, notes, plan, changes = prepare_shopping_list_sync(inputs, synced_items, item_ids)
+    for line in result.splitlines():
+        report(line)
+
+    progress.phase("writing")
+
+    writer = ParallelWriter(SHOPPING_LIST_WRITE_WORKERS)
+    if notes:
+        writer.submit("notes", ", ".join(notes), grocy.add_notes_to_shopping_list, notes)
+
+    for operation in plan.writes:
+        writer.submit(operation.ingredient.gid, operation.ingredient.name, apply_shopping_list_operation, operation)
+
+    failed_keys = set()
+
+    def on_write(write: WriteResult):
+        if not write.success:
+            failed_keys.add(write.key)
+            report(f"{write.description} {_("could not be written to Grocy")}: {write.error}")
+
+    writer.run(on_write)
+
+    progress.phase("cleanup")
+    cleanup_result = clean_up_mealie_shoppinglist(record_synced_items(changes, plan, notes, failed_keys))
+    for line in cleanup_result.splitlines():
+        report(line)
+
+    grocy.http.log_connection_stats()
+    mealie.http.log_connection_stats()
+
+    if not lines:
+        return _("Shopping list is up to date."), True
+
+    return "".join(f"{line}\n" for line in lines), not failed_keys and not cleanup_result
+
+
+def get_sync_state(mealie_state: str | None = None) -> str:
+    """
+    Fingerprint of everything a shopping list sync depends on: the grocy database and the mealie shopping list
+    :param mealie_state: State of the mealie shopping list if it was already taken
+    """
+    if mealie_state is None:
+        mealie_state = mealie.get_shopping_list_state()
+    return f"{grocy.get_db_changed_time()}|{mealie_state}"
+
+
+def sync_shoppinglist_if_changed(progress: JobProgress | None = None) -> str | None:
+    """
+    Run the shopping list sync unless neither grocy nor the mealie shopping list changed since the last successful run
+    :return: Result text or None if the sync was skipped
+    """
+    store = get_state_store()
+
+    # Taken before the sync, so items added to mealie while it runs trigger the next one
+    mealie_state = mealie.get_shopping_list_state()
+    if get_sync_state(mealie_state) == store.get_meta(SYNC_STATE_KEY):
+        logging.info("Grocy and mealie shopping list unchanged, skipping sync")
+        return None
+
+    result, success = _update_grocy_shoppinglist(progress or JobProgress())
+
+    # Grocy is taken after the sync, so its own writes do not trigger the next one. Failed items are retried next time.
+    store.set_meta(SYNC_STATE_KEY, get_sync_state(mealie_state) if success else None)
 
     return result
 
 
+def run_scheduled_sync():
+    """
+    Scheduler task, runs the sync as a job so it is coalesced with syncs started in the web UI
+    """
+    runner = get_job_runner()
+    job_id, _ = runner.submit("shoppinglist", sync_shoppinglist_if_changed)
+
+    job = runner.wait(job_id)
+    if job is None or job["status"] == FAILED:
+        raise Exception(f"Failed to sync shopping list: {job['error'] if job else 'job lost'}")
+
+
+def start_scheduler() -> PeriodicScheduler | None:
+    """
+    Start automatic shopping list syncs if SYNC_INTERVAL is set
+    """
+    if SYNC_INTERVAL <= 0:
+        return None
+
+    logging.info(f"Synchronizing the shopping list every {SYNC_INTERVAL} minutes")
+    scheduler = PeriodicScheduler("scheduler-shoppinglist", SYNC_INTERVAL * 60, run_scheduled_sync, get_state_store(), lease_ttl=JOB_LEASE_TTL)
+    scheduler.start()
+
+    # Hand the lease to another worker right away when this one shuts down
+    atexit.register(scheduler.stop, 5)
+    return scheduler
+
+
+def sync_mealie_items(item_ids: set[str], progress: JobProgress | None = None) -> str:
+    """
+    Transfer only the given mealie shopping list items to grocy, e.g. the items named by a webhook event
+    """
+    return _update_grocy_shoppinglist(progress or JobProgress(), item_ids)[0]
+
+
+def process_webhook_events(keys: set[str]):
+    """
+    Debouncer callback: run one sync for a burst of webhook events
+    :param keys: Affected mealie shopping list item ids, FULL_SYNC if an event did not name its items
+    """
+    def task(progress: JobProgress):
+        if FULL_SYNC in keys:
+            return sync_shoppinglist_if_changed(progress)
+        return sync_mealie_items(keys, progress)
+
+    # A sync that is already running may have loaded the list before these events, run again once it is
+    # finished. Another sync, e.g. a scheduled one, can take its place in the meantime, so wait until ours started.
+    runner = get_job_runner()
+    job_id, started = runner.submit("shoppinglist", task)
+    while not started:
+        runner.wait(job_id)
+        job_id, started = runner.submit("shoppinglist", task)
+
+
+def get_webhook_debouncer() -> Debouncer:
+    global _webhook_debouncer
+    if _webhook_debouncer is None:
+        _webhook_debouncer = Debouncer(WEBHOOK_DEBOUNCE, process_webhook_events)
+    return _webhook_debouncer
+
+
+def plan_grocy_shoppinglist_from_mealie() -> dict:
+    """
+    Dry run of update_grocy_shoppinglist_from_mealie, nothing is written to grocy or mealie
+    :return: Dict with the result text, the notes and the planned shopping list operations
+    """
+    inputs = fetch_sync_inputs(clear_checked=False)
+
+    result, notes, plan, _changes = prepare_shopping_list_sync(inputs, get_state_store().get_shopping_list_items())
+
+    return {"result": result, "notes": notes, "plan": plan.to_dict()}
+
+
 def clear_mealie_shoppinglist():
     return mealie.clear_shoppinglist()
 
 
-def compare_product_databases():
+def get_product_diff() -> ProductDiff:
     grocy_products = grocy.get_all_products()
     mealie_foods = mealie.get_all_foods()
 
+    return ProductDiff.for_catalog(grocy_products, mealie_foods)
+
+
+def compare_product_databases():
+    diff = get_product_diff()
+
+    if diff.is_empty():
+        return _("Product databases are identical.")
+
     result = ""
-    for product in grocy_products:
-        if product.name not in [food.name for food in mealie_foods]:
-            result += f"{product.name} {_("missing in")} Mealie.\n"
+    for product in diff.missing_in_mealie:
+        result += f"{product['name']} {_("missing in")} Mealie.\n"
 
-    for food in mealie_foods:
-        if food.name not in [product.name for product in grocy_products]:
-            result += f"{food.name} {_("missing in")} Grocy.\n"
+    for food in diff.missing_in_grocy:
+        result += f"{food['name']} {_("missing in")} Grocy.\n"
 
-    if result == "":
-        result = _("Product databases are identical.")
+        suggestions = ", ".join(food["suggestions"])
+        if suggestions:
+            result += f"    {_("Similar products")}: {suggestions}\n"
 
     return result
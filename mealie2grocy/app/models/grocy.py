@@ -38,6 +38,19 @@ class GrocyStockItem:
     def from_json(cls, data):
         return cls(data["product"]["id"], data["product"]["name"], data["stock_amount_aggregated"], data["stock_amount_opened"], data["product"]["min_stock_amount"], data["product"]["qu_id_stock"], data["quantity_unit_stock"]["name"])
 
+    @classmethod
+    def from_product_json(cls, product, stock_entry, stock_unit):
+        """
+        Build a stock item from a product object and its entry of the /stock overview
+        :param product: Product as returned by /objects/products
+        :param stock_entry: Entry of /stock for this product, None if the product is not in stock
+        :param stock_unit: Name of the stock quantity unit
+        """
+        stock = stock_entry["amount_aggregated"] if stock_entry else 0
+        stock_opened = stock_entry["amount_opened_aggregated"] if stock_entry else 0
+
+        return cls(product["id"], product["name"], stock, stock_opened, product["min_stock_amount"], product["qu_id_stock"], stock_unit)
+
 
 class GrocyUnit:
     def __init__(self, gid, name):
@@ -47,3 +60,20 @@ class GrocyUnit:
     @classmethod
     def from_json(cls, data):
         return cls(data["id"], data["name"])
+
+
+class GrocyShoppingListItem:
+    def __init__(self, gid, product_id, amount, qu_id, note=None, done=False):
+        self.id = gid
+        self.product_id = product_id
+        self.amount = amount
+        self.qu_id = qu_id
+        self.note = note
+        self.done = done
+
+    def __str__(self):
+        return f"{self.amount} x {self.product_id}"
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data.get("id"), data["product_id"], data["amount"], data["qu_id"], data.get("note"), data["done"] == 1)
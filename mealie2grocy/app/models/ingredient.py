@@ -18,6 +18,23 @@ class Ingredient:
         else:
             raise ValueError(f"Cannot add ingredients with different units: {self.unit} and {other.unit}")
 
+    @staticmethod
+    def aggregate(ingredients: list['Ingredient']) -> list['Ingredient']:
+        """
+        Combine ingredients of the same product and unit in a single pass
+        :param ingredients: Ingredients to aggregate, they are not modified
+        :return: New list with one ingredient per (gid, unit), in order of first occurrence
+        """
+        aggregated: dict[tuple, Ingredient] = {}
+        for ingredient in ingredients:
+            key = (ingredient.gid, ingredient.unit)
+            if key in aggregated:
+                aggregated[key].add(ingredient)
+            else:
+                aggregated[key] = Ingredient(ingredient.name, ingredient.amount, ingredient.unit, ingredient.note, ingredient.mid, ingredient.gid)
+
+        return list(aggregated.values())
+
     @classmethod
     def from_mealie_json(cls, data) -> 'Ingredient | None':
         if data["food"] is None:
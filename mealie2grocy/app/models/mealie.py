@@ -17,6 +17,33 @@ class MealieFoodItem:
         return f"{self.name} ({self.plural_name}): {self.description}"
 
 
+class MealieFoodImportSummary:
+    def __init__(self):
+        self.created: list[str] = []
+        self.updated: list[str] = []
+        self.skipped: list[str] = []
+        self.failed: dict[str, str] = {}  # Food name -> error
+
+    def __str__(self):
+        return f"{len(self.created)} created, {len(self.updated)} updated, {len(self.skipped)} skipped, {len(self.failed)} failed"
+
+    def to_dict(self):
+        return {"created": self.created, "updated": self.updated, "skipped": self.skipped, "failed": self.failed}
+
+
+class MealieShoppingListUpdateSummary:
+    def __init__(self, mode: str):
+        self.mode = mode  # "check" or "delete"
+        self.succeeded: list[str] = []  # Item ids
+        self.failed: dict[str, str] = {}  # Item id -> error
+
+    def __str__(self):
+        return f"{self.mode}: {len(self.succeeded)} succeeded, {len(self.failed)} failed"
+
+    def to_dict(self):
+        return {"mode": self.mode, "succeeded": self.succeeded, "failed": self.failed}
+
+
 class MealieRecipe:
     def __init__(self, mid, name, ingredients):
         self.mid = mid
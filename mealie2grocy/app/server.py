@@ -1,14 +1,18 @@
+import json
 import json.decoder
 import logging
 from time import sleep
 
 import requests.exceptions
-from flask import Flask, jsonify, request, render_template, url_for
+from flask import Flask, Response, jsonify, request, render_template, url_for, copy_current_request_context
 from flask_babel import Babel, _
 
 from config import LOG_LEVEL, API_KEYS, API_PORT
 from main import update_products_in_mealie, update_grocy_shoppinglist_from_mealie, compare_product_databases, \
-    test_grocy_connection, test_mealie_connection, clear_mealie_shoppinglist
+    get_product_diff, test_grocy_connection, test_mealie_connection, clear_mealie_shoppinglist, \
+    plan_grocy_shoppinglist_from_mealie, get_job_runner, start_scheduler, get_webhook_debouncer
+from models.mealie import MealieFoodImportSummary
+from services.webhook import affected_items
 
 logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s - %(levelname)-8s - %(name)-10s - %(message)s')
 
@@ -20,41 +24,100 @@ app.config['BABEL_DEFAULT_LOCALE'] = 'en'
 app.config['BABEL_SUPPORTED_LOCALES'] = ['en', 'de']
 app.config['BABEL_TRANSLATION_DIRECTORIES'] = './translations'
 
-lock_shoppinglist_update = False
-
 def get_locale():
     return request.accept_languages.best_match(app.config['BABEL_SUPPORTED_LOCALES'])
 
 
 babel = Babel(app, locale_selector=get_locale)
 
+# Automatic syncs, every worker starts a scheduler and only one of them runs the syncs
+scheduler = start_scheduler()
+
 
 @app.route('/update-mealie-products', methods=['GET'])
 def update_mealie_products():
     if not check_auth(request):
         return response_unauthorized()
 
-    update_products_in_mealie()
+    incremental = request.args.get("incremental", "false").lower() in ("1", "true", "yes")
+    summary = update_products_in_mealie(incremental=incremental)
+
+    if isinstance(summary, MealieFoodImportSummary):
+        return jsonify({"success": not summary.failed, "summary": summary.to_dict()})
+
     return jsonify({"success": True})
 
 
 @app.route('/update-grocy-shoppinglist', methods=['GET'])
 def update_grocy_shoppinglist():
-    global lock_shoppinglist_update
     if not check_auth(request):
         return response_unauthorized()
 
-    if lock_shoppinglist_update:
-        return jsonify({"success": False, "message": _("Process currently running. Please wait...")})
+    # The sync runs in the background, a sync that is already running in any worker is reused.
+    # The request context is kept for the job, so the result is translated to the language of the request.
+    job_id, started = get_job_runner().submit("shoppinglist", copy_current_request_context(update_grocy_shoppinglist_from_mealie))
+
+    message = _("Synchronization started") if started else _("Process currently running. Please wait...")
+    return jsonify({"success": True, "message": message, "job_id": job_id})
+
+
+@app.route('/webhook', methods=['POST'])
+def webhook():
+    """
+    Receive change notifications from the mealie notifier, grocy or Home Assistant. Bursts of events are
+    collected and synced once, events that name their shopping list items only sync those items.
+    """
+    if not check_api_key(request):
+        return response_unauthorized()
+
+    get_webhook_debouncer().add(affected_items(request.get_json(silent=True)))
+    return jsonify({"success": True, "message": _("Synchronization scheduled")}), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    if not check_auth(request):
+        return response_unauthorized()
+
+    job = get_job_runner().get(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": _("Job not found")}), 404
+
+    return jsonify({"success": job["status"] != "failed", **job})
+
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def get_job_events(job_id):
+    """
+    Stream the phases and result lines of a job as Server-Sent Events until the job is finished
+    """
+    if not check_auth(request):
+        return response_unauthorized()
+
+    runner = get_job_runner()
+    if runner.get(job_id) is None:
+        return jsonify({"success": False, "message": _("Job not found")}), 404
+
+    # Reconnecting browsers continue after the last event they received
+    after_id = request.headers.get("Last-Event-ID", 0, type=int)
+
+    def stream():
+        for event in runner.follow(job_id, after_id):
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    return Response(stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 
-    # Call method async
-    # thread = threading.Thread(target=update_grocy_shoppinglist_from_mealie)
-    # thread.start()
+@app.route('/plan-grocy-shoppinglist', methods=['GET'])
+def plan_grocy_shoppinglist():
+    if not check_auth(request):
+        return response_unauthorized()
 
-    lock_shoppinglist_update = True
-    result = update_grocy_shoppinglist_from_mealie()
-    lock_shoppinglist_update = False
-    return jsonify({"success": True, "message": _("Mealie shopping list transfered to Grocy"), "result": result})
+    plan = plan_grocy_shoppinglist_from_mealie()
+    return jsonify({"success": True, "message": _("Planned changes to the Grocy shopping list"), **plan})
 
 
 @app.route('/compare-product-databases', methods=['GET'])
@@ -62,7 +125,15 @@ def compare_m2g_databases():
     if not check_auth(request):
         return response_unauthorized()
 
-    result = compare_product_databases()
+    if request.args.get("format") == "json":
+        page = request.args.get("page", 1, type=int)
+        per_page = request.args.get("per_page", None, type=int)
+        if page < 1 or (per_page is not None and per_page < 1):
+            return jsonify({"success": False, "message": _("page and per_page must be at least 1")}), 400
+        result = get_product_diff().to_dict(page, per_page)
+    else:
+        result = compare_product_databases()
+
     return jsonify({"success": True, "message": _("Compare Productdatabases"), "result": result})
 
 
@@ -113,9 +184,9 @@ def is_ingress():
     return request.headers.get('X-Ingress-Path', None) is not None
 
 
-def ingress_url_for(url: str):
+def ingress_url_for(url: str, **values):
     ingress_path = request.headers.get('X-Ingress-Path', "")
-    return ingress_path + url_for(url)
+    return ingress_path + url_for(url, **values)
 
 
 def ingress_username():
@@ -136,6 +207,20 @@ def check_auth(request) -> bool:
         return True
 
 
+def check_api_key(request) -> bool:
+    """
+    Webhooks are not sent through the ingress, so they always need an api key as Bearer token. Query parameters
+    are not accepted, they would end up in the access log.
+    """
+    auth_header = request.headers.get("Authorization", "")
+    token = auth_header[len("Bearer "):] if auth_header.startswith("Bearer ") else None
+
+    if not token or token not in API_KEYS:
+        logging.warning("Unauthorized webhook denied.")
+        return False
+    return True
+
+
 def response_unauthorized():
     return jsonify({"error": "Unauthorized", "message": _("Not logged in.")}), 403
 
@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+
+class ChangeAwareCache:
+    """
+    Size and TTL bounded cache for master data that is revalidated against a change marker of the source.
+
+    Every entry remembers the source version it was loaded at. The current version is requested from the
+    source at most once per revalidate interval, so a burst of lookups costs a single cheap version check.
+    """
+
+    def __init__(self, version_loader: Callable[[], Any], ttl: float, max_entries: int, revalidate_interval: float):
+        self.version_loader = version_loader
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.revalidate_interval = revalidate_interval
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: OrderedDict[str, tuple[Any, Any, float]] = OrderedDict()  # key -> (version, value, loaded at)
+        self._version = None
+        self._version_checked_at = None
+        self._lock = threading.Lock()
+        self._version_lock = threading.Lock()
+        self._loading: dict[str, threading.Lock] = {}  # Concurrent misses of a key wait for a single load
+
+    def version(self, force: bool = False):
+        """
+        Get the current version of the source
+        :param force: Ask the source even if the last check is recent
+        """
+        with self._version_lock:
+            now = time.monotonic()
+            if not force and self._version_checked_at is not None and now - self._version_checked_at < self.revalidate_interval:
+                return self._version
+
+            version = self.version_loader()
+
+            with self._lock:
+                self._version = version
+                self._version_checked_at = now
+
+            return version
+
+    def get(self, key: str, loader: Callable[[], Any]):
+        """
+        Get a cached value or load it
+        :param key: Cache key
+        :param loader: Called to load the value if it is missing, expired or outdated
+        """
+        version = self.version()
+
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            now = time.monotonic()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == version and now - entry[2] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+
+                self.misses += 1
+
+            value = loader()
+
+            with self._lock:
+                self._entries[key] = (version, value, now)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+            return value
+
+    def invalidate(self, key: str | None = None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CatalogCache:
+    """
+    Keeps the last object that was built for a catalog, e.g. a matcher or a diff, and reuses it while the
+    catalog version does not change. Building it again for an unchanged catalog would cost O(N).
+    """
+
+    def __init__(self):
+        self._cached: tuple[tuple, Any] | None = None
+        self._lock = threading.Lock()
+
+    def get(self, version: tuple, build: Callable[[], Any]):
+        """
+        Get the object for a catalog version
+        :param version: Identifies the catalog, see product_matcher.catalog_version
+        :param build: Called to build the object if the version changed
+        """
+        with self._lock:
+            if self._cached is not None and self._cached[0] == version:
+                return self._cached[1]
+
+        value = build()
+
+        with self._lock:
+            self._cached = (version, value)
+
+        return value
@@ -0,0 +1,54 @@
+import logging
+import threading
+import time
+from typing import Callable, Hashable
+
+
+class Debouncer:
+    """
+    Collects keys from bursts of events and hands them to a callback in one batch.
+
+    The batch is flushed when no new key arrived for `delay` seconds, or at the latest `max_wait` seconds
+    after its first key, so a steady stream of events cannot postpone it forever. The callback runs on a
+    background thread.
+    """
+
+    def __init__(self, delay: float, flush: Callable[[set], None], max_wait: float | None = None):
+        self.delay = delay
+        self.max_wait = max_wait if max_wait is not None else delay * 6
+        self.flush = flush
+
+        self.lock = threading.Lock()
+        self.pending: set = set()
+        self.first_added = 0.0
+        self.last_added = 0.0
+        self.thread: threading.Thread | None = None
+
+    def add(self, keys: set[Hashable]):
+        with self.lock:
+            now = time.monotonic()
+            if not self.pending:
+                self.first_added = now
+            self.last_added = now
+            self.pending |= keys
+
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._wait_and_flush, name="debouncer", daemon=True)
+                self.thread.start()
+
+    def _wait_and_flush(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                due = min(self.last_added + self.delay, self.first_added + self.max_wait)
+                if now >= due:
+                    keys, self.pending = self.pending, set()
+                    self.thread = None
+                    break
+
+            time.sleep(due - now)
+
+        try:
+            self.flush(keys)
+        except Exception as e:
+            logging.error(f"Failed to process {len(keys)} debounced events: {e}")
@@ -0,0 +1,83 @@
+import re
+from collections import Counter
+
+from models.grocy import GrocyProductItem
+from services.cache import CatalogCache
+from services.product_matcher import normalize, catalog_version
+
+# Amounts and fractions in free text notes, e.g. "2 Dosen Tomaten" or "1/2 kg Mehl"
+QUANTITY_PATTERN = re.compile(r"[\d.,/½¼¾]+")
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    Character trigrams of a normalized text, padded so short words and word starts are represented
+    """
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyMatcher:
+    """
+    Suggests grocy products for names without an exact match.
+
+    Candidates are collected from a trigram inverted index over the product catalog and ranked by the
+    Dice coefficient of their trigram sets. Trigrams that occur in a large share of the catalog are only
+    used if the query has no rarer ones, which keeps lookups fast for large catalogs.
+    """
+
+    _catalog_cache = CatalogCache()
+
+    def __init__(self, grocy_products: list[GrocyProductItem], min_score: float = 0.4, max_candidates: int = 50):
+        self.products = list(grocy_products)
+        self.min_score = min_score
+        self.max_candidates = max_candidates
+
+        self.product_trigrams: list[set[str]] = []
+        self.index: dict[str, list[int]] = {}
+        for position, product in enumerate(self.products):
+            grams = trigrams(normalize(product.name))
+            self.product_trigrams.append(grams)
+            for gram in grams:
+                self.index.setdefault(gram, []).append(position)
+
+        self.common_trigram_threshold = max(50, len(self.products) // 10)
+
+    @classmethod
+    def for_catalog(cls, grocy_products: list[GrocyProductItem]) -> 'FuzzyMatcher':
+        """
+        Get a matcher for the catalog, reusing the last one if the catalog did not change
+        """
+        return cls._catalog_cache.get(catalog_version(grocy_products), lambda: cls(grocy_products))
+
+    def suggest(self, text: str, limit: int = 3) -> list[tuple[GrocyProductItem, float]]:
+        """
+        Rank grocy products that are similar to a text
+        :param text: Product name or free text note
+        :param limit: Maximum number of suggestions
+        :return: List of (product, score) with the best match first
+        """
+        query = normalize(QUANTITY_PATTERN.sub(" ", text or ""))
+        if not query:
+            return []
+
+        query_trigrams = trigrams(query)
+        postings = [self.index[gram] for gram in query_trigrams if gram in self.index]
+        rare_postings = [posting for posting in postings if len(posting) <= self.common_trigram_threshold]
+
+        shared = Counter()
+        for posting in rare_postings or postings:
+            shared.update(posting)
+
+        scored = []
+        for position, _ in shared.most_common(self.max_candidates):
+            grams = self.product_trigrams[position]
+            score = 2 * len(query_trigrams & grams) / (len(query_trigrams) + len(grams))
+            if score >= self.min_score:
+                scored.append((self.products[position], round(score, 2)))
+
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:limit]
+
+    def suggest_names(self, text: str, limit: int = 3) -> list[str]:
+        return [product.name for product, _ in self.suggest(text, limit)]
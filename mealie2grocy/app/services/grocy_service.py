@@ -1,51 +1,53 @@
+import html
 import json
 import logging
+import re
 from time import sleep
 from typing import Tuple
 
 from flask_babel import _
 
-import requests
-
-from models.grocy import GrocyProductItem, GrocyStockItem, GrocyUnit
+from models.grocy import GrocyProductItem, GrocyStockItem, GrocyUnit, GrocyShoppingListItem
+from config import GROCY_CACHE_TTL, GROCY_CACHE_MAX_ENTRIES, GROCY_CACHE_REVALIDATE_INTERVAL, SHOPPING_LIST_MAX_NOTES
 from models.ingredient import Ingredient
+from services.cache import ChangeAwareCache
+from services.http_client import HttpClient
+
+NOTE_PATTERN = re.compile(r"<p>(.*?)</p>", re.DOTALL)
+
+
+def parse_notes(description: str) -> list[str]:
+    """
+    Split the HTML description of a shopping list into its paragraphs
+    """
+    notes = [note.strip() for note in NOTE_PATTERN.findall(description)]
+    return [note for note in notes if note]
 
 
 class GrocyInstance:
     def __init__(self, api_key, endpoint):
         self.api_key = api_key
         self.endpoint = endpoint
-        self.default_get_headers = {
-            "GROCY-API-KEY": api_key,
-            "accept": "application/json"
-        }
-
         self.default_post_headers = {
-            "GROCY-API-KEY": api_key,
             "Content-Type": "application/json"
         }
 
-    def get_all_products(self):
-        url = f"{self.endpoint}/objects/products"
+        self.http = HttpClient(headers={
+            "GROCY-API-KEY": api_key,
+            "accept": "application/json"
+        })
 
-        retries = 3
-        success = False
-        while not success and retries > 0:
-            # Grocy sometimes fails to respond correctly, so we retry a few times
-            response = requests.get(url, headers=self.default_get_headers)
+        # Products, units and conversions rarely change, so they are cached until Grocy reports a change
+        self.cache = ChangeAwareCache(self.get_db_changed_time, GROCY_CACHE_TTL, GROCY_CACHE_MAX_ENTRIES, GROCY_CACHE_REVALIDATE_INTERVAL)
 
-            if response.status_code != 200:
-                raise Exception(f"Failed to get products from grocy: {response.text}")
+    def get_db_changed_time(self) -> str:
+        return self._get_json("/system/db-changed-time", "database change time")["changed_time"]
 
-            try:
-                data = json.loads(response.text)
-                success = True
-            except json.JSONDecodeError:
-                logging.error(f"Failed to decode grocy response.")
-                retries -= 1
-                sleep(.2)
-
-        if not success:
+    def get_all_products(self):
+        try:
+            # Grocy sometimes fails to respond correctly, so we retry a few times
+            data = self._get_master_data("/objects/products", "products", retries=3)
+        except json.JSONDecodeError:
             return _("Grocy does not respond. Please try again.")
 
         products = []
@@ -59,7 +61,7 @@ class GrocyInstance:
     def get_product(self, product_id) -> GrocyProductItem:
         url = f"{self.endpoint}/objects/products/{product_id}"
 
-        response = requests.get(url, headers=self.default_get_headers)
+        response = self.http.get(url)
 
         if response.status_code != 200:
             raise Exception(f"Failed to get product from grocy: {response.text}")
@@ -73,7 +75,7 @@ class GrocyInstance:
     def get_stock_product(self, product_id) -> GrocyStockItem:
         url = f"{self.endpoint}/stock/products/{product_id}"
 
-        response = requests.get(url, headers=self.default_get_headers)
+        response = self.http.get(url)
 
         if response.status_code != 200:
             raise Exception(f"Failed to get stock product from grocy: {response.text}")
@@ -83,10 +85,26 @@ class GrocyInstance:
 
         return stock_item
 
+    def get_stock_snapshot(self) -> dict[int, GrocyStockItem]:
+        """
+        Load the stock of all products with a constant number of requests
+        :return: Stock items indexed by product id, including products that are not in stock
+        """
+        products = self._get_master_data("/objects/products", "products")
+        units = {unit["id"]: unit["name"] for unit in self._get_master_data("/objects/quantity_units", "units")}
+        stock = {entry["product_id"]: entry for entry in self._get_json("/stock", "stock")}
+
+        stock_items = {}
+        for product in products:
+            stock_unit = units.get(product["qu_id_stock"])
+            stock_items[product["id"]] = GrocyStockItem.from_product_json(product, stock.get(product["id"]), stock_unit)
+
+        return stock_items
+
     def get_unit(self, unit_id) -> str:
         url = f"{self.endpoint}/objects/quantity_units/{unit_id}"
 
-        response = requests.get(url, headers=self.default_get_headers)
+        response = self.http.get(url)
 
         if response.status_code != 200:
             raise Exception(f"Failed to get unit from grocy: {response.text}")
@@ -95,41 +113,51 @@ class GrocyInstance:
 
         return data["name"]
 
-    def get_shopping_list_ingredients(self) -> dict[int, 'Ingredient']:
+    def get_shopping_list_items(self) -> list[GrocyShoppingListItem]:
+        """
+        Get the open rows of the grocy shopping list
+        """
         url = f"{self.endpoint}/objects/shopping_list"
 
-        response = requests.get(url, headers=self.default_get_headers)
+        response = self.http.get(url)
 
         if response.status_code != 200:
             raise Exception(f"Failed to get shopping list from grocy: {response.text}")
 
-        data = json.loads(response.text)
+        items = [GrocyShoppingListItem.from_json(item) for item in json.loads(response.text)]
+        return [item for item in items if not item.done]
+
+    def get_shopping_list_ingredients(self, products: dict[int, GrocyProductItem] | None = None, units: dict[int, GrocyUnit] | None = None,
+                                      items: list[GrocyShoppingListItem] | None = None) -> dict[int, 'Ingredient']:
+        """
+        Get the open items of the grocy shopping list
+        :param products: Already loaded products indexed by id, fetched in one request if not given
+        :param units: Already loaded units indexed by id, fetched in one request if not given
+        :param items: Already loaded shopping list rows, fetched if not given
+        :return: Ingredients indexed by product id
+        """
+        if products is None:
+            products = {product.id: product for product in self.get_all_products()}
+        if units is None:
+            units = self.get_units()
+        if items is None:
+            items = self.get_shopping_list_items()
 
         ingredients = {}
-        for item in data:
-            if item["done"] == 1:
-                continue
-
-            product_item = self.get_product(item["product_id"])
-            unit = self.get_unit(item["qu_id"])
-            gid = item["product_id"]
+        for item in items:
+            gid = item.product_id
+            product_item = products.get(gid) or self.get_product(gid)
+            unit = units[item.qu_id].name if item.qu_id in units else self.get_unit(item.qu_id)
 
             if gid in ingredients:
-                ingredients[gid].amount += item["amount"]
+                ingredients[gid].amount += item.amount
             else:
-                ingredients[gid] = Ingredient(product_item.name, item["amount"], unit, gid=gid)
+                ingredients[gid] = Ingredient(product_item.name, item.amount, unit, gid=gid)
 
         return ingredients
 
     def get_units(self) -> dict[int, GrocyUnit]:
-        url = f"{self.endpoint}/objects/quantity_units"
-
-        response = requests.get(url, headers=self.default_get_headers)
-
-        if response.status_code != 200:
-            raise Exception(f"Failed to get units from grocy: {response.text}")
-
-        data = json.loads(response.text)
+        data = self._get_master_data("/objects/quantity_units", "units")
 
         units = {}
         for unit_json in data:
@@ -141,14 +169,7 @@ class GrocyInstance:
     def get_unit_conversions(self) -> dict[Tuple[str, str], float]:
         units = self.get_units()
 
-        url = f"{self.endpoint}/objects/quantity_unit_conversions"
-
-        response = requests.get(url, headers=self.default_get_headers)
-
-        if response.status_code != 200:
-            raise Exception(f"Failed to get conversions from grocy: {response.text}")
-
-        data = json.loads(response.text)
+        data = self._get_master_data("/objects/quantity_unit_conversions", "conversions")
 
         conversions = {}
         for conversion in data:
@@ -163,7 +184,7 @@ class GrocyInstance:
     def get_unit_conversion_resolved(self, product_id: int) -> dict[Tuple[str, str], float]:
         url = f"{self.endpoint}/objects/quantity_unit_conversions_resolved?query%5B%5D=product_id%3D{product_id}"
 
-        response = requests.get(url, headers=self.default_get_headers)
+        response = self.http.get(url)
 
         if response.status_code != 200:
             raise Exception(f"Failed to get stock product from grocy: {response.text}")
@@ -178,6 +199,22 @@ class GrocyInstance:
 
         return conversions
 
+    def get_unit_conversions_resolved(self, product_ids) -> dict[int, dict[Tuple[str, str], float]]:
+        """
+        Get the resolved conversions of several products with one request
+        :param product_ids: Products to get conversions for
+        :return: Conversions per product id, products without conversions map to an empty dict
+        """
+        product_ids = set(product_ids)
+        data = self._get_master_data("/objects/quantity_unit_conversions_resolved", "resolved conversions")
+
+        conversions = {product_id: {} for product_id in product_ids}
+        for conversion in data:
+            if conversion["product_id"] in product_ids:
+                conversions[conversion["product_id"]][(conversion["from_qu_name"], conversion["to_qu_name"])] = conversion["factor"]
+
+        return conversions
+
     def add_to_shopping_list(self, ingredient: 'Ingredient', amount: float):
         url = f"{self.endpoint}/objects/shopping_list"
 
@@ -187,18 +224,29 @@ class GrocyInstance:
             "note": ingredient.note
         }
 
-        response = requests.request("POST", url, headers=self.default_post_headers, data=json.dumps(data))
+        response = self.http.post(url, headers=self.default_post_headers, data=json.dumps(data))
 
         if response.status_code != 200:
             raise Exception(f"Failed to add item to shopping list: {response.text}")
 
+    def update_shopping_list_item(self, item_id, amount: float):
+        """
+        Change the amount of an existing shopping list row, its note and unit are kept
+        """
+        url = f"{self.endpoint}/objects/shopping_list/{item_id}"
+
+        response = self.http.put(url, headers=self.default_post_headers, data=json.dumps({"amount": amount}))
+
+        if response.status_code != 204:
+            raise Exception(f"Failed to update item on shopping list: {response.text}")
+
     def remove_from_shopping_list(self, gid):
         url = f"{self.endpoint}/stock/shoppinglist/remove-product"
         body = {
             "product_id": gid
         }
 
-        response = requests.post(url, headers=self.default_post_headers, data=json.dumps(body))
+        response = self.http.post(url, headers=self.default_post_headers, data=json.dumps(body))
 
         if response.status_code != 204:
             raise Exception(f"Failed to remove item from shopping list: {response.text}")
@@ -210,43 +258,74 @@ class GrocyInstance:
             "done_only": True
         }
 
-        response = requests.post(url, headers=self.default_post_headers, data=json.dumps(body))
+        response = self.http.post(url, headers=self.default_post_headers, data=json.dumps(body))
 
         if response.status_code != 204:
             raise Exception(f"Failed to clear checked items from shopping list: {response.text}")
 
     def add_note_to_shopping_list(self, note: str):
+        self.add_notes_to_shopping_list([note])
+
+    def add_notes_to_shopping_list(self, notes: list[str], max_notes: int = SHOPPING_LIST_MAX_NOTES):
+        """
+        Add notes to the description of the shopping list with one read and at most one write
+        :param notes: Notes to add, notes that are already in the description are skipped
+        :param max_notes: Keep only the newest notes, 0 keeps all
+        """
         url = f"{self.endpoint}/objects/shopping_lists/1"
 
-        response = requests.get(url, headers=self.default_get_headers)
+        response = self.http.get(url)
 
         if response.status_code != 200:
             raise Exception(f"Failed to read shopping list notes: {response.text}")
 
         payload = json.loads(response.text)
 
-        current_notes = ""
+        description = payload.get("description") or ""
+        current_notes = parse_notes(description)
+        merged_notes = list(dict.fromkeys(current_notes + [html.escape(note, quote=False) for note in notes]))
+
+        if max_notes > 0:
+            merged_notes = merged_notes[-max_notes:]
 
-        if "description" in payload:
-            current_notes = payload["description"]
+        if merged_notes == current_notes:
+            return
 
-            if note in current_notes:
-                # Do not add note if it already exists
-                return
+        # Text outside of paragraphs was not written by the sync and is kept as it is
+        other_text = NOTE_PATTERN.sub("", description).strip()
 
         body = {
-            "description": f"{current_notes}<p>{note}</p>"
+            "description": other_text + "".join(f"<p>{note}</p>" for note in merged_notes)
         }
 
-        response = requests.put(url, headers=self.default_post_headers, data=json.dumps(body))
+        response = self.http.put(url, headers=self.default_post_headers, data=json.dumps(body))
 
         if response.status_code != 204:
             raise Exception(f"Failed to add note to shopping list: {response.text}")
 
+    def _get_master_data(self, path: str, description: str, retries: int = 1):
+        return self.cache.get(path, lambda: self._get_json(path, description, retries))
+
+    def _get_json(self, path: str, description: str, retries: int = 1):
+        while True:
+            response = self.http.get(f"{self.endpoint}{path}")
+
+            if response.status_code != 200:
+                raise Exception(f"Failed to get {description} from grocy: {response.text}")
+
+            try:
+                return json.loads(response.text)
+            except json.JSONDecodeError:
+                logging.error(f"Failed to decode grocy response.")
+                retries -= 1
+                if retries <= 0:
+                    raise
+                sleep(.2)
+
     def test_connection(self):
         url = f"{self.endpoint}/system/info"
 
-        response = requests.get(url, headers=self.default_get_headers, timeout=1)
+        response = self.http.get(url, timeout=1)
 
         if response.status_code != 200:
             return False
@@ -0,0 +1,82 @@
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_TIMEOUT
+
+
+class HttpClient:
+    """
+    Pooled HTTP transport shared by the Grocy and Mealie services.
+
+    Wraps a requests.Session so connections are kept alive and reused per host instead of
+    opening a new TCP/TLS connection for every API call.
+    """
+
+    def __init__(self, headers: dict[str, str] | None = None, pool_connections: int = HTTP_POOL_CONNECTIONS,
+                 pool_maxsize: int = HTTP_POOL_MAXSIZE, timeout: float = HTTP_TIMEOUT):
+        self.timeout = timeout
+        self.session = requests.Session()
+
+        if headers:
+            self.session.headers.update(headers)
+
+        # One pool per host, kept alive between calls
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    def ensure_pool_maxsize(self, pool_maxsize: int):
+        """
+        Grow the per-host pools, e.g. for callers that keep more requests in flight than the configured size
+        """
+        if self.adapter._pool_maxsize >= pool_maxsize:
+            return
+
+        previous_adapter = self.adapter
+        self.adapter = HTTPAdapter(pool_connections=previous_adapter._pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        previous_adapter.close()
+
+    def get(self, url, **kwargs) -> requests.Response:
+        return self.session.get(url, timeout=kwargs.pop("timeout", self.timeout), **kwargs)
+
+    def post(self, url, **kwargs) -> requests.Response:
+        return self.session.post(url, timeout=kwargs.pop("timeout", self.timeout), **kwargs)
+
+    def put(self, url, **kwargs) -> requests.Response:
+        return self.session.put(url, timeout=kwargs.pop("timeout", self.timeout), **kwargs)
+
+    def delete(self, url, **kwargs) -> requests.Response:
+        return self.session.delete(url, timeout=kwargs.pop("timeout", self.timeout), **kwargs)
+
+    def request(self, method, url, **kwargs) -> requests.Response:
+        return self.session.request(method, url, timeout=kwargs.pop("timeout", self.timeout), **kwargs)
+
+    def connection_stats(self) -> dict[str, dict[str, int]]:
+        """
+        Report connection reuse per host
+        :return: Mapping of host to number of requests, opened connections and reused connections
+        """
+        stats = {}
+        for key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+
+            host = f"{pool.host}:{pool.port}" if pool.port else pool.host
+            entry = stats.setdefault(host, {"requests": 0, "connections": 0, "reused": 0})
+            entry["requests"] += pool.num_requests
+            entry["connections"] += pool.num_connections
+            entry["reused"] += max(pool.num_requests - pool.num_connections, 0)
+
+        return stats
+
+    def log_connection_stats(self):
+        for host, entry in self.connection_stats().items():
+            logging.info(f"Connections to {host}: {entry['requests']} requests, {entry['connections']} opened, {entry['reused']} reused")
+
+    def close(self):
+        self.session.close()
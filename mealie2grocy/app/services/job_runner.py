@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Callable, Iterator
+
+from services.state_store import StateStore
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Finished jobs are kept this long for the status endpoints
+JOB_RETENTION = 7 * 24 * 3600
+
+
+class JobProgress:
+    """
+    Progress of a running job. Phases and result lines are recorded as events of the job, so they can
+    be streamed to clients while the job runs. Without a store, reports are discarded.
+    """
+
+    def __init__(self, store: StateStore | None = None, job_id: str | None = None):
+        self.store = store
+        self.job_id = job_id
+
+    def phase(self, name: str):
+        if self.store is None:
+            return
+        self.store.update_job(self.job_id, progress=name)
+        self.store.add_job_event(self.job_id, "phase", name)
+
+    def line(self, text: str):
+        if self.store is None or not text:
+            return
+        self.store.add_job_event(self.job_id, "line", text)
+
+
+class JobRunner:
+    """
+    Runs long tasks in background threads and records their state in the state store.
+
+    Only one job of a kind runs at a time across all gunicorn workers: a job holds a lease in the shared
+    SQLite database while it runs. Submitting a kind that is already running returns the running job
+    instead of starting a second one. The lease is renewed while the job runs, released when it ends
+    and expires on its own if the worker process dies.
+    """
+
+    def __init__(self, store: StateStore, lease_ttl: float):
+        self.store = store
+        self.lease_ttl = lease_ttl
+
+    def submit(self, kind: str, task: Callable[[JobProgress], Any]) -> tuple[str, bool]:
+        """
+        Start a job unless one of the same kind is running
+        :param kind: Jobs of the same kind are coalesced
+        :param task: Called with the JobProgress of the job, its result has to be JSON serializable
+        :return: Tuple of job id and whether a new job was started
+        """
+        job_id = uuid.uuid4().hex
+
+        if not self.store.acquire_lease(kind, job_id, self.lease_ttl):
+            running_job_id = self.store.get_lease_owner(kind)
+            if running_job_id is not None:
+                return running_job_id, False
+
+            # The lease expired in the meantime
+            return self.submit(kind, task)
+
+        try:
+            # A lease that could be taken means earlier unfinished jobs lost their worker
+            self.store.fail_stale_jobs(kind, (QUEUED, RUNNING), "Interrupted")
+            self.store.delete_jobs_before(time.time() - JOB_RETENTION)
+            self.store.create_job(job_id, kind, QUEUED)
+
+            threading.Thread(target=self._run, args=(kind, job_id, task), name=f"job-{kind}", daemon=True).start()
+        except Exception:
+            self.store.release_lease(kind, job_id)
+            raise
+
+        return job_id, True
+
+    def get(self, job_id: str) -> dict | None:
+        return self.store.get_job(job_id)
+
+    def wait(self, job_id: str, poll_interval: float = 1) -> dict:
+        """
+        Block until a job is finished
+        :return: The finished job
+        """
+        while True:
+            job = self.store.get_job(job_id)
+            if job is None or job["status"] in (DONE, FAILED):
+                return job
+            time.sleep(poll_interval)
+
+    def follow(self, job_id: str, after_id: int = 0, poll_interval: float = .25, heartbeat_interval: float = 15) -> Iterator[dict | None]:
+        """
+        Yield the events of a job as they are recorded, until the job is finished
+        :param after_id: Id of the last event the client already has
+        :param poll_interval: Seconds between checks for new events
+        :param heartbeat_interval: Yield None after this many seconds without events, to keep connections open
+        :return: Events with id, event and data. The last one is a DONE or FAILED event.
+        """
+        last_event = time.monotonic()
+        while True:
+            for event in self.store.get_job_events(job_id, after_id):
+                after_id = event["id"]
+                last_event = time.monotonic()
+                yield event
+
+                if event["event"] in (DONE, FAILED):
+                    return
+
+            job = self.store.get_job(job_id)
+            if job is None:
+                yield {"id": after_id, "event": FAILED, "data": None}
+                return
+
+            if job["status"] in (DONE, FAILED) and not self.store.get_job_events(job_id, after_id):
+                # Finished without a final event, e.g. interrupted by a dead worker
+                yield {"id": after_id, "event": job["status"], "data": job["result"] if job["status"] == DONE else job["error"]}
+                return
+
+            if time.monotonic() - last_event >= heartbeat_interval:
+                last_event = time.monotonic()
+                yield None
+
+            time.sleep(poll_interval)
+
+    def _run(self, kind: str, job_id: str, task: Callable):
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(target=self._renew_lease, args=(kind, job_id, stop_heartbeat), name=f"lease-{kind}", daemon=True)
+        heartbeat.start()
+
+        try:
+            self.store.update_job(job_id, status=RUNNING)
+            result = task(JobProgress(self.store, job_id))
+            self.store.finish_job(job_id, DONE, result=result)
+        except Exception as e:
+            logging.exception(f"Job {kind} {job_id} failed")
+            try:
+                self.store.finish_job(job_id, FAILED, error=str(e))
+            except Exception:
+                logging.exception(f"Failed to record the state of job {job_id}")
+        finally:
+            stop_heartbeat.set()
+            heartbeat.join()
+            self.store.release_lease(kind, job_id)
+
+    def _renew_lease(self, kind: str, job_id: str, stop: threading.Event):
+        while not stop.wait(self.lease_ttl / 3):
+            try:
+                self.store.renew_lease(kind, job_id, self.lease_ttl)
+            except Exception as e:
+                logging.warning(f"Failed to renew lease of job {job_id}: {e}")
@@ -1,12 +1,19 @@
 import json
 import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from time import sleep
+from typing import Any, Callable, Iterator
 
-import requests
-
+from config import MEALIE_PAGE_SIZE, MEALIE_PAGE_PREFETCH, RECIPE_CACHE_SIZE, RECIPE_FETCH_WORKERS, FOOD_IMPORT_WORKERS, \
+    FOOD_IMPORT_RETRIES, MEALIE_BULK_BATCH_SIZE, MEALIE_BULK_WORKERS
 from models.grocy import GrocyProductItem
 from models.ingredient import Ingredient
-from models.mealie import MealieFoodItem, MealieRecipe, MealieUnit
+from models.mealie import MealieFoodItem, MealieFoodImportSummary, MealieRecipe, MealieUnit, MealieShoppingListUpdateSummary
+from services.http_client import HttpClient
+from services.product_matcher import ProductMatcher, food_names, normalize
 
 
 class MealieInstance:
@@ -17,35 +24,135 @@ class MealieInstance:
             "Authorization": f"Bearer {api_key}",
             "accept": "application/json"
         }
+        self.http = HttpClient(headers=self.default_headers)
+
+        # Parsed recipes by (recipe id, dateUpdated), least recently used first
+        self.recipe_cache: OrderedDict[tuple[str, str], MealieRecipe] = OrderedDict()
+        self.recipe_cache_lock = threading.Lock()
+
+    def paginate(self, path: str, parse: Callable[[dict], Any], description: str, params: dict | None = None,
+                 per_page: int = MEALIE_PAGE_SIZE, prefetch: int = MEALIE_PAGE_PREFETCH) -> Iterator[Any]:
+        """
+        Lazily iterate over a paginated mealie collection
+        :param path: Collection path, e.g. /foods
+        :param parse: Converts an item to a model object, items it maps to None are skipped
+        :param description: Collection name for error messages
+        :param params: Additional query parameters
+        :param per_page: Page size
+        :param prefetch: Number of upcoming pages that are requested concurrently, 0 to load page by page
+        """
+        def load(page):
+            return self._get_page(path, description, params, page, per_page)
+
+        def parse_items(data):
+            for item in data["items"]:
+                parsed = parse(item)
+                if parsed is not None:
+                    yield parsed
+
+        data = load(1)
+        yield from parse_items(data)
+
+        total_pages = data.get("total_pages", data.get("totalPages"))
+
+        if total_pages is None:
+            # Unknown page count, continue until a page is not full
+            page = 1
+            while len(data["items"]) >= per_page:
+                page += 1
+                data = load(page)
+                yield from parse_items(data)
+            return
 
-    def get_all_foods(self):
-        # See https://my.smada.homes:9090/group/data/foods/
-        url = f"{self.endpoint}/foods?page=1&perPage=1000"
+        if prefetch <= 0:
+            for page in range(2, total_pages + 1):
+                yield from parse_items(load(page))
+            return
 
-        response = requests.get(url, headers=self.default_headers)
+        with ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix="mealie-pages") as executor:
+            pending = deque()
+            next_page = 2
+            while next_page <= total_pages or pending:
+                # Keep up to `prefetch` pages in flight while the caller consumes the current one
+                while next_page <= total_pages and len(pending) < prefetch:
+                    pending.append(executor.submit(load, next_page))
+                    next_page += 1
 
-        if response.status_code != 200:
-            raise Exception(f"Failed to get foods from mealie: {response.text}")
+                yield from parse_items(pending.popleft().result())
 
-        data = json.loads(response.text)
+    def _get_page(self, path: str, description: str, params: dict | None, page: int, per_page: int) -> dict:
+        response = self.http.get(f"{self.endpoint}{path}", params={**(params or {}), "page": page, "perPage": per_page})
 
-        # Create a list of MealieFoodItem objects
-        foods = []
-        for item in data["items"]:
-            foods.append(MealieFoodItem(item["id"], item["name"], item["pluralName"], item["description"], item["aliases"]))
+        if response.status_code != 200:
+            raise Exception(f"Failed to get {description} from mealie: {response.text}")
 
-        return foods
+        return json.loads(response.text)
 
-    def create_food_items_from_grocy_products_if_not_present(self, grocy_products: list[GrocyProductItem], existing_foods: list[MealieFoodItem]):
+    def iter_foods(self) -> Iterator[MealieFoodItem]:
+        # See https://my.smada.homes:9090/group/data/foods/
+        return self.paginate("/foods", lambda item: MealieFoodItem(item["id"], item["name"], item["pluralName"], item["description"], item["aliases"]), "foods")
+
+    def get_all_foods(self) -> list[MealieFoodItem]:
+        return list(self.iter_foods())
+
+    def create_food_items_from_grocy_products_if_not_present(self, grocy_products: list[GrocyProductItem], existing_foods: list[MealieFoodItem],
+                                                             workers: int = FOOD_IMPORT_WORKERS, retries: int = FOOD_IMPORT_RETRIES) -> MealieFoodImportSummary:
+        """
+        Create mealie foods for all grocy products that have no matching food yet
+        :param grocy_products: Products to import
+        :param existing_foods: Foods already present in mealie
+        :param workers: Number of concurrent create requests
+        :param retries: Attempts per food before it is reported as failed
+        :return: Summary of created, skipped and failed foods
+        """
+        summary = MealieFoodImportSummary()
+        matcher = ProductMatcher.for_catalog(grocy_products, existing_foods)
+
+        # Normalized names of all foods, including the ones created during this run
+        known_names = {normalize(name) for food in existing_foods for name in food_names(food)}
+
+        missing = []
         for product in grocy_products:
-            food_item = MealieFoodItem(None, product.name, None, product.description)
-            self.create_food_item_if_not_present(food_item, existing_foods)
+            key = normalize(product.name)
+            if matcher.has_food(product) or key in known_names:
+                # Present under a different spelling, plural name or alias, or twice in grocy
+                logging.info(f"Skipping existing item: {product.name}")
+                summary.skipped.append(product.name)
+                continue
+
+            known_names.add(key)
+            missing.append(MealieFoodItem(None, product.name, None, product.description))
+
+        def create(food_item: MealieFoodItem):
+            for attempt in range(1, retries + 1):
+                try:
+                    self.create_food_item(food_item)
+                    return None
+                except Exception as e:
+                    logging.warning(f"Attempt {attempt} to create {food_item.name} failed: {e}")
+                    if attempt < retries:
+                        sleep(.2 * attempt)
+                    else:
+                        return str(e)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mealie-foods") as executor:
+            for food_item, error in zip(missing, executor.map(create, missing)):
+                if error is None:
+                    summary.created.append(food_item.name)
+                else:
+                    summary.failed[food_item.name] = error
+
+        logging.info(f"Food import: {summary}")
+        return summary
 
     def create_food_item_if_not_present(self, food_item: MealieFoodItem, existing_foods: list[MealieFoodItem]):
         if food_item.name in [food.name for food in existing_foods]:
             logging.info(f"Skipping existing item: {food_item.name}")
             return
 
+        self.create_food_item(food_item)
+
+    def create_food_item(self, food_item: MealieFoodItem):
         url = f"{self.endpoint}/foods"
         data = {
             "name": food_item.name,
@@ -53,64 +160,137 @@ class MealieInstance:
             "description": food_item.description if food_item.description else "",
             "aliases": food_item.aliases
         }
-        response = requests.request("POST", url, headers=self.default_headers, data=json.dumps(data))
+        response = self.http.post(url, json=data)
 
         if response.status_code != 201:
             raise Exception(f"Failed to create food item in mealie: {response.text}")
 
+    def update_food_description(self, food: MealieFoodItem, description: str | None):
+        url = f"{self.endpoint}/foods/{food.mid}"
+        data = {
+            "id": food.mid,
+            "name": food.name,
+            "pluralName": food.plural_name,
+            "description": description if description else "",
+            "aliases": food.aliases
+        }
+        response = self.http.put(url, json=data)
+
+        if response.status_code != 200:
+            raise Exception(f"Failed to update food item in mealie: {response.text}")
+
+        food.description = description
+
     def get_week_plan(self) -> list[MealieRecipe]:
         url = f"{self.endpoint}/households/mealplans?start_date={datetime.now().strftime('%Y-%m-%d')}&orderBy=date&orderDirection=asc&page=1&perPage=100"
 
-        response = requests.get(url, headers=self.default_headers)
+        response = self.http.get(url)
 
         if response.status_code != 200:
             raise Exception(f"Failed to get week plan from mealie: {response.text}")
 
         data = json.loads(response.text)
 
-        # Create a list of MealieRecipes objects
-        meals = []
-        for item in data["items"]:
-            recipe = self.get_recipe(item["recipe"]["id"])
-            meals.append(recipe)
+        # Entries without a recipe are plain notes
+        keys = [self._recipe_cache_key(item["recipe"]) for item in data["items"] if item.get("recipe")]
+
+        recipes = self.get_recipes_cached(keys)
 
-        return meals
+        # Create a list of MealieRecipes objects
+        return [recipes[key] for key in keys]
+
+    @staticmethod
+    def _recipe_cache_key(recipe_summary) -> tuple[str, str]:
+        return recipe_summary["id"], recipe_summary.get("dateUpdated") or recipe_summary.get("updatedAt") or recipe_summary.get("updateAt")
+
+    def get_recipes_cached(self, keys: list[tuple[str, str]]) -> dict[tuple[str, str], MealieRecipe]:
+        """
+        Get recipes from the cache, loading missing or updated ones concurrently
+        :param keys: List of (recipe id, dateUpdated), may contain duplicates
+        :return: Recipes by key
+        """
+        recipes = {}
+        missing = []
+        with self.recipe_cache_lock:
+            for key in dict.fromkeys(keys):
+                if key in self.recipe_cache and key[1] is not None:
+                    self.recipe_cache.move_to_end(key)
+                    recipes[key] = self.recipe_cache[key]
+                else:
+                    missing.append(key)
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=RECIPE_FETCH_WORKERS, thread_name_prefix="mealie-recipes") as executor:
+                loaded = executor.map(lambda key: self.get_recipe(key[0]), missing)
+                recipes.update(zip(missing, loaded))
+
+            with self.recipe_cache_lock:
+                for key in missing:
+                    self.recipe_cache[key] = recipes[key]
+                    self.recipe_cache.move_to_end(key)
+                while len(self.recipe_cache) > RECIPE_CACHE_SIZE:
+                    self.recipe_cache.popitem(last=False)
+
+        return recipes
+
+    def iter_shopping_list_items(self) -> Iterator[dict]:
+        return self.paginate("/households/shopping/items", lambda item: item, "shopping list")
+
+    def get_shopping_list_state(self) -> str:
+        """
+        Cheap fingerprint of the shopping list: number of items and the newest update time. It changes when
+        an item is added, changed, checked or deleted.
+        """
+        data = self._get_page("/households/shopping/items", "shopping list", {"orderBy": "updatedAt", "orderDirection": "desc"}, 1, 1)
+
+        items = data.get("items", [])
+        latest_update = items[0].get("updatedAt", items[0].get("updateAt")) if items else None
+
+        return f"{data.get('total', len(items))}:{latest_update}"
 
     def get_shopping_list_ingredients(self) -> list['Ingredient']:
-        url = f"{self.endpoint}/households/shopping/items?page=1&perPage=1000"
+        return list(self.iter_shopping_list_ingredients())
 
-        response = requests.get(url, headers=self.default_headers)
+    def iter_shopping_list_ingredients(self) -> Iterator['Ingredient']:
+        return self.paginate("/households/shopping/items", self._parse_shopping_list_item, "shopping list")
 
-        if response.status_code != 200:
-            raise Exception(f"Failed to get shopping list from mealie: {response.text}")
+    def get_shopping_list_ingredients_by_id(self, item_ids: set[str], workers: int = MEALIE_BULK_WORKERS) -> list['Ingredient']:
+        """
+        Load single shopping list items, items that were checked or deleted in the meantime are skipped
+        """
+        def load(item_id):
+            response = self.http.get(f"{self.endpoint}/households/shopping/items/{item_id}")
 
-        data = json.loads(response.text)
+            if response.status_code == 404:
+                return None
+            if response.status_code != 200:
+                raise Exception(f"Failed to get shopping list item from mealie: {response.text}")
 
-        # Create a list of Ingredient objects
-        ingredients: list[Ingredient] = []
-        for food_item in data["items"]:
-            if food_item["checked"] is True:
-                continue
+            return self._parse_shopping_list_item(json.loads(response.text))
 
-            # Handle notes that are not in the food DB
-            food_name = food_item["food"]["name"] if food_item["food"] else None
-            if not food_name:
-                if not food_item["note"]:
-                    continue
-                food_name = food_item["note"]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mealie-items") as executor:
+            return [ingredient for ingredient in executor.map(load, sorted(item_ids)) if ingredient is not None]
 
-            unit = food_item["unit"]["name"] if food_item["unit"] is not None else None
+    @staticmethod
+    def _parse_shopping_list_item(food_item) -> 'Ingredient | None':
+        if food_item["checked"] is True:
+            return None
 
-            ingredient = Ingredient(food_name, food_item["quantity"], unit, note=food_item["note"], mid=food_item["id"])
+        # Handle notes that are not in the food DB
+        food_name = food_item["food"]["name"] if food_item["food"] else None
+        if not food_name:
+            if not food_item["note"]:
+                return None
+            food_name = food_item["note"]
 
-            ingredients.append(ingredient)
+        unit = food_item["unit"]["name"] if food_item["unit"] is not None else None
 
-        return ingredients
+        return Ingredient(food_name, food_item["quantity"], unit, note=food_item["note"], mid=food_item["id"])
 
     def get_recipe(self, mid) -> MealieRecipe:
         url = f"{self.endpoint}/recipes/{mid}"
 
-        response = requests.get(url, headers=self.default_headers)
+        response = self.http.get(url)
 
         if response.status_code != 200:
             raise Exception(f"Failed to get recipe from mealie: {response.text}")
@@ -120,39 +300,87 @@ class MealieInstance:
         return MealieRecipe.from_json(data)
 
     def get_units(self) -> list[MealieUnit]:
-        url = f"{self.endpoint}/units?page=1&perPage=1000"
-
-        response = requests.get(url, headers=self.default_headers)
-
-        if response.status_code != 200:
-            raise Exception(f"Failed to get units from mealie: {response.text}")
+        return list(self.paginate("/units", MealieUnit.from_json, "units"))
 
-        data = json.loads(response.text)
+    def clear_shoppinglist(self):
+        try:
+            summary = self.update_shopping_list_items(None, "delete")
+        except Exception as e:
+            logging.error(f"Failed to clear mealie shopping list: {e}")
+            return False
 
-        units = []
-        for unit in data["items"]:
-            units.append(MealieUnit.from_json(unit))
+        return not summary.failed
+
+    def update_shopping_list_items(self, item_ids: set[str] | None, mode: str, batch_size: int = MEALIE_BULK_BATCH_SIZE,
+                                   workers: int = MEALIE_BULK_WORKERS) -> MealieShoppingListUpdateSummary:
+        """
+        Check off or delete shopping list items in batches, batches are sent concurrently
+        :param item_ids: Items to change, None for all items on the list
+        :param mode: "check" to mark the items as checked, "delete" to delete them
+        :param batch_size: Maximum number of items per request, keeps the URLs of bulk deletes short
+        :param workers: Number of concurrent requests
+        :return: Summary with the result of every item
+        """
+        if mode not in ("check", "delete"):
+            raise ValueError(f"Unknown shopping list update mode: {mode}")
+
+        summary = MealieShoppingListUpdateSummary(mode)
+        if item_ids is not None and not item_ids:
+            return summary
+
+        send = self._check_shopping_list_items if mode == "check" else self._delete_shopping_list_items
+
+        def run(batch: list[dict]):
+            try:
+                send(batch)
+                return None
+            except Exception as e:
+                logging.error(f"Failed to {mode} {len(batch)} mealie shopping list items: {e}")
+                return str(e)
+
+        # Read the whole list before changing it, deleted items would shift later items to earlier pages
+        items = [
+            item for item in self.iter_shopping_list_items()
+            if (item_ids is None or item["id"] in item_ids) and not (mode == "check" and item["checked"])
+        ]
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mealie-bulk") as executor:
+            futures = []
+            for start in range(0, len(items), batch_size):
+                batch = items[start:start + batch_size]
+                futures.append((batch, executor.submit(run, batch)))
+
+            for batch, future in futures:
+                error = future.result()
+                for item in batch:
+                    if error is None:
+                        summary.succeeded.append(item["id"])
+                    else:
+                        summary.failed[item["id"]] = error
+
+        logging.info(f"Mealie shopping list items {summary}")
+        return summary
+
+    def _check_shopping_list_items(self, items: list[dict]):
+        url = f"{self.endpoint}/households/shopping/items"
+        data = [{**item, "checked": True} for item in items]
 
-        return units
+        response = self.http.put(url, json=data)
 
-    def clear_shoppinglist(self):
-        # Get all
-        url = f"{self.endpoint}/households/shopping/items?page=1&perPage=1000"
-        response = requests.get(url, headers=self.default_headers)
-        items = json.loads(response.text)["items"]
-        item_ids = [item["id"] for item in items]
+        if response.status_code != 200:
+            raise Exception(f"Failed to check shopping list items in mealie: {response.text}")
 
+    def _delete_shopping_list_items(self, items: list[dict]):
         url = f"{self.endpoint}/households/shopping/items"
-        response = requests.delete(url, headers=self.default_headers, params={"ids": item_ids})
 
-        if response.status_code == 200:
-            return True
-        else:
-            return False
+        response = self.http.delete(url, params={"ids": [item["id"] for item in items]})
+
+        if response.status_code != 200:
+            raise Exception(f"Failed to delete shopping list items in mealie: {response.text}")
 
     def test_connection(self):
         url = f"{self.endpoint}/app/about"
-        response = requests.get(url)
+        response = self.http.get(url)
 
         if response.status_code != 200:
             return False
@@ -0,0 +1,69 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Hashable
+
+
+class WriteResult:
+    def __init__(self, key: Hashable, description: str, error: Exception | None = None):
+        self.key = key
+        self.description = description
+        self.error = error
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+    def __str__(self):
+        return f"{self.description}: {self.error or 'ok'}"
+
+
+class ParallelWriter:
+    """
+    Runs writes on a bounded thread pool.
+
+    Writes with the same key (e.g. the product id) run one after the other in the order they were submitted,
+    writes with different keys run concurrently. A failing write is recorded and does not stop the others.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.queues: dict[Hashable, list[tuple[str, Callable, tuple]]] = {}
+
+    def submit(self, key: Hashable, description: str, write: Callable, *args):
+        """
+        Queue a write
+        :param key: Writes with the same key keep their order
+        :param description: Shown in the result, e.g. the product name
+        """
+        self.queues.setdefault(key, []).append((description, write, args))
+
+    def run(self, on_result: Callable[[WriteResult], None] | None = None) -> list[WriteResult]:
+        """
+        Execute all queued writes
+        :param on_result: Called with each result as soon as the write finished, from the worker thread
+        :return: One result per write, grouped by key in order of submission
+        """
+        queues, self.queues = self.queues, {}
+        if not queues:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(queues)), thread_name_prefix="writer") as executor:
+            futures = [executor.submit(self._run_queue, key, queue, on_result) for key, queue in queues.items()]
+            return [result for future in futures for result in future.result()]
+
+    @staticmethod
+    def _run_queue(key: Hashable, queue: list[tuple[str, Callable, tuple]], on_result: Callable[[WriteResult], None] | None) -> list[WriteResult]:
+        results = []
+        for description, write, args in queue:
+            try:
+                write(*args)
+                result = WriteResult(key, description)
+            except Exception as e:
+                logging.error(f"Failed to write {description}: {e}")
+                result = WriteResult(key, description, e)
+
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+
+        return results
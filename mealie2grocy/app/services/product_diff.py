@@ -0,0 +1,95 @@
+import hashlib
+
+from models.grocy import GrocyProductItem
+from models.mealie import MealieFoodItem
+from services.cache import CatalogCache
+from services.fuzzy_matcher import FuzzyMatcher
+from services.product_matcher import ProductMatcher, food_names, normalize, catalog_version
+
+SECTIONS = ["missing_in_mealie", "missing_in_grocy", "alias_matches", "name_conflicts"]
+
+
+class ProductDiff:
+    """
+    Structured difference between the grocy product catalog and the mealie foods.
+
+    Both directions are computed with dictionary lookups of the normalized names, so a diff costs
+    O(N + M) instead of comparing every product with every food. The last diff is reused while
+    neither catalog changes.
+
+    Sections:
+    - missing_in_mealie: grocy products without a mealie food
+    - missing_in_grocy: mealie foods without a grocy product, with suggestions for similar products
+    - alias_matches: mealie foods that only match a grocy product through their plural name or an alias
+    - name_conflicts: names that are used by more than one grocy product or more than one mealie food
+    """
+
+    _catalog_cache = CatalogCache()
+
+    def __init__(self, grocy_products: list[GrocyProductItem], mealie_foods: list[MealieFoodItem], version: tuple | None = None):
+        if version is None:
+            version = catalog_version(grocy_products, mealie_foods)
+        self.version = hashlib.sha256(repr(version).encode()).hexdigest()[:16]
+
+        matcher = ProductMatcher.for_catalog(grocy_products, mealie_foods)
+
+        self.missing_in_mealie: list[dict] = []
+        self.missing_in_grocy: list[dict] = []
+        self.alias_matches: list[dict] = []
+        self.name_conflicts: list[dict] = []
+
+        products_by_name: dict[str, list[GrocyProductItem]] = {}
+        for product in grocy_products:
+            products_by_name.setdefault(normalize(product.name), []).append(product)
+            if not matcher.has_food(product):
+                self.missing_in_mealie.append({"id": product.id, "name": product.name})
+
+        # Foods missing in Grocy are most likely spelled differently than a product that is missing in Mealie
+        fuzzy = FuzzyMatcher([product for product in grocy_products if not matcher.has_food(product)])
+
+        foods_by_name: dict[str, list[MealieFoodItem]] = {}
+        for food in mealie_foods:
+            foods_by_name.setdefault(normalize(food.name), []).append(food)
+
+            product = matcher.match_food(food)
+            if product is None:
+                self.missing_in_grocy.append({"id": food.mid, "name": food.name, "suggestions": fuzzy.suggest_names(food.name)})
+            elif normalize(product.name) != normalize(food.name):
+                via = next(name for name in food_names(food) if normalize(name) == normalize(product.name))
+                self.alias_matches.append({"food": food.name, "product": product.name, "via": via})
+
+        for source, items_by_name in (("grocy", products_by_name), ("mealie", foods_by_name)):
+            for items in items_by_name.values():
+                if len(items) > 1:
+                    self.name_conflicts.append({"source": source, "name": items[0].name, "names": [item.name for item in items]})
+
+    @classmethod
+    def for_catalog(cls, grocy_products: list[GrocyProductItem], mealie_foods: list[MealieFoodItem]) -> 'ProductDiff':
+        """
+        Get the diff for the catalogs, reusing the last one if neither catalog changed
+        """
+        version = catalog_version(grocy_products, mealie_foods)
+        return cls._catalog_cache.get(version, lambda: cls(grocy_products, mealie_foods, version))
+
+    def is_empty(self) -> bool:
+        return not self.missing_in_mealie and not self.missing_in_grocy
+
+    def to_dict(self, page: int = 1, per_page: int | None = None) -> dict:
+        """
+        Diff as JSON serializable dict
+        :param page: Page of every section, starting at 1
+        :param per_page: Maximum number of entries per section, all entries if None
+        :return: Dict with the entries of the page per section, the total count per section and the catalog version
+        """
+        result = {"version": self.version, "page": page, "per_page": per_page, "total": {}}
+
+        for section in SECTIONS:
+            entries = getattr(self, section)
+            result["total"][section] = len(entries)
+
+            if per_page is not None:
+                start = (page - 1) * per_page
+                entries = entries[start:start + per_page]
+            result[section] = entries
+
+        return result
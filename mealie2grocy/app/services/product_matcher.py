@@ -0,0 +1,123 @@
+import re
+import unicodedata
+
+from models.grocy import GrocyProductItem
+from models.mealie import MealieFoodItem
+from services.cache import CatalogCache
+
+# Plural endings that are tried when a name has no exact match, e.g. "Tomaten" -> "Tomate", "Eggs" -> "Egg"
+PLURAL_SUFFIXES = ['es', 'en', 'n', 's', 'e']
+
+
+def normalize(name: str) -> str:
+    """
+    Normalize a product name for matching: unicode normalization, case folding and collapsed whitespace
+    """
+    name = unicodedata.normalize("NFKC", name).casefold()
+    return re.sub(r"\s+", " ", name).strip()
+
+
+def food_names(food: MealieFoodItem) -> list[str]:
+    """
+    All names of a mealie food: name, plural name and aliases
+    """
+    names = [food.name, food.plural_name]
+    for alias in food.aliases or []:
+        names.append(alias.get("name") if isinstance(alias, dict) else alias)
+
+    return [name for name in names if isinstance(name, str) and name]
+
+
+def catalog_version(grocy_products: list[GrocyProductItem], mealie_foods: list[MealieFoodItem] | None = None) -> tuple:
+    """
+    Everything of the catalogs that matching depends on, equal versions mean equal matches
+    """
+    return (
+        tuple((product.id, product.name) for product in grocy_products),
+        tuple((food.mid, tuple(food_names(food))) for food in mealie_foods or [])
+    )
+
+
+class ProductMatcher:
+    """
+    Matches ingredient and food names to grocy products with dictionary lookups.
+
+    Grocy product names are indexed normalized. Mealie foods add their plural names and aliases as
+    additional keys for the grocy product they match.
+    """
+
+    _catalog_cache = CatalogCache()
+
+    def __init__(self, grocy_products: list[GrocyProductItem], mealie_foods: list[MealieFoodItem] | None = None):
+        self.products_by_name: dict[str, GrocyProductItem] = {}
+        self.products_by_alias: dict[str, GrocyProductItem] = {}
+        self.foods_by_product_id: dict[int, MealieFoodItem] = {}
+
+        for product in grocy_products:
+            self.products_by_name.setdefault(normalize(product.name), product)
+
+        for food in mealie_foods or []:
+            product = self.match_food(food)
+            if product is None:
+                continue
+
+            self.foods_by_product_id.setdefault(product.id, food)
+            for name in food_names(food):
+                self.products_by_alias.setdefault(normalize(name), product)
+
+    @classmethod
+    def for_catalog(cls, grocy_products: list[GrocyProductItem], mealie_foods: list[MealieFoodItem] | None = None) -> 'ProductMatcher':
+        """
+        Get a matcher for the catalogs, reusing the last one if neither catalog changed
+        """
+        return cls._catalog_cache.get(catalog_version(grocy_products, mealie_foods), lambda: cls(grocy_products, mealie_foods))
+
+    def match(self, name: str) -> GrocyProductItem | None:
+        """
+        Find the grocy product for a name
+        :return: Grocy product or None if there is no match
+        """
+        return self.match_with_kind(name)[0]
+
+    def match_with_kind(self, name: str) -> tuple[GrocyProductItem | None, str | None]:
+        """
+        Find the grocy product for a name and report how it was matched
+        :return: Tuple of grocy product and one of "name", "alias" and "plural", or (None, None)
+        """
+        if not name:
+            return None, None
+
+        key = normalize(name)
+
+        product = self.products_by_name.get(key)
+        if product is not None:
+            return product, "name"
+
+        product = self.products_by_alias.get(key)
+        if product is not None:
+            return product, "alias"
+
+        for suffix in PLURAL_SUFFIXES:
+            if key.endswith(suffix) and len(key) > len(suffix) + 2:
+                product = self.products_by_name.get(key[:-len(suffix)])
+                if product is not None:
+                    return product, "plural"
+
+        return None, None
+
+    def match_food(self, food: MealieFoodItem) -> GrocyProductItem | None:
+        """
+        Find the grocy product for a mealie food by its name, plural name or aliases
+        """
+        for name in food_names(food):
+            product = self.products_by_name.get(normalize(name))
+            if product is not None:
+                return product
+
+        return None
+
+    def has_food(self, product: GrocyProductItem) -> bool:
+        """
+        Check if a mealie food matches the grocy product
+        """
+        return product.id in self.foods_by_product_id
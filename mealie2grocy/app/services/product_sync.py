@@ -0,0 +1,92 @@
+import hashlib
+import logging
+
+from models.grocy import GrocyProductItem
+from models.mealie import MealieFoodImportSummary
+from services.grocy_service import GrocyInstance
+from services.mealie_service import MealieInstance
+from services.product_matcher import ProductMatcher
+from services.state_store import StateStore
+
+CHANGED_TIME_KEY = "products_grocy_changed_time"
+
+
+def product_hash(product: GrocyProductItem) -> str:
+    """
+    Hash of the product fields that are transferred to mealie
+    """
+    content = f"{product.name}\0{product.description or ''}"
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class IncrementalProductSync:
+    """
+    Transfers new and changed grocy products to mealie.
+
+    A hash per grocy product is stored after each run. If Grocy reports no change since the last run, the
+    run costs a single request. Otherwise only products whose hash is new or different are sent to mealie.
+    """
+
+    def __init__(self, grocy: GrocyInstance, mealie: MealieInstance, store: StateStore):
+        self.grocy = grocy
+        self.mealie = mealie
+        self.store = store
+
+    def run(self) -> MealieFoodImportSummary:
+        changed_time = self.grocy.get_db_changed_time()
+        if changed_time == self.store.get_meta(CHANGED_TIME_KEY):
+            logging.info("Grocy products unchanged since last product sync")
+            return MealieFoodImportSummary()
+
+        products = self.grocy.get_all_products()
+        stored_hashes = self.store.get_product_hashes()
+
+        hashes = {product.id: product_hash(product) for product in products}
+        new_products = [product for product in products if product.id not in stored_hashes]
+        changed_products = [product for product in products if product.id in stored_hashes and stored_hashes[product.id] != hashes[product.id]]
+        removed_product_ids = set(stored_hashes) - set(hashes)
+
+        logging.info(f"Product sync: {len(new_products)} new, {len(changed_products)} changed, {len(removed_product_ids)} removed")
+
+        summary = MealieFoodImportSummary()
+        if new_products or changed_products:
+            foods = self.mealie.get_all_foods()
+
+            if new_products:
+                summary = self.mealie.create_food_items_from_grocy_products_if_not_present(new_products, foods)
+
+            self._update_descriptions(changed_products, foods, summary)
+
+        # Products that failed are retried on the next run
+        failed_names = set(summary.failed)
+        self.store.update_product_hashes({product.id: hashes[product.id] for product in products if product.name not in failed_names}, removed_product_ids)
+
+        if not failed_names:
+            self.store.set_meta(CHANGED_TIME_KEY, changed_time)
+
+        return summary
+
+    def _update_descriptions(self, products: list[GrocyProductItem], foods, summary: MealieFoodImportSummary):
+        matcher = ProductMatcher(products, foods)
+
+        for product in products:
+            food = matcher.foods_by_product_id.get(product.id)
+
+            if food is None:
+                # Renamed in grocy, create a food for the new name
+                result = self.mealie.create_food_items_from_grocy_products_if_not_present([product], foods)
+                summary.created.extend(result.created)
+                summary.skipped.extend(result.skipped)
+                summary.failed.update(result.failed)
+                continue
+
+            if (food.description or None) == (product.description or None):
+                summary.skipped.append(product.name)
+                continue
+
+            try:
+                self.mealie.update_food_description(food, product.description)
+                summary.updated.append(product.name)
+            except Exception as e:
+                logging.error(f"Failed to update {food.name} in mealie: {e}")
+                summary.failed[product.name] = str(e)
@@ -0,0 +1,94 @@
+import logging
+import random
+import threading
+import uuid
+from typing import Callable
+
+from services.state_store import StateStore
+
+
+class PeriodicScheduler:
+    """
+    Runs a task in a background thread at a fixed interval.
+
+    Every gunicorn worker starts its own scheduler, a lease in the state store makes sure only one of them
+    runs the task. The owner renews the short lease while its process lives, so it moves to another worker
+    shortly after the owner is gone, e.g. after a restart or a recycled worker. The interval is randomized by
+    the jitter, so several instances do not hit the servers at the same moment, and it doubles after every
+    failed run up to max_backoff times the interval.
+    """
+
+    def __init__(self, name: str, interval: float, task: Callable[[], None], store: StateStore, jitter: float = .1, max_backoff: int = 8,
+                 lease_ttl: float = 60):
+        """
+        :param name: Name of the lease, schedulers with the same name share it
+        :param interval: Seconds between runs
+        :param task: Raises an exception if the run failed
+        :param lease_ttl: Seconds the lease is kept without renewal
+        """
+        self.name = name
+        self.interval = interval
+        self.task = task
+        self.store = store
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.lease_ttl = lease_ttl
+
+        self.owner = uuid.uuid4().hex
+        self.failures = 0
+        self.stopped = threading.Event()
+        self.thread: threading.Thread | None = None
+        self.heartbeat: threading.Thread | None = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, name=f"scheduler-{self.name}", daemon=True)
+        self.thread.start()
+        self.heartbeat = threading.Thread(target=self._renew_lease, name=f"lease-{self.name}", daemon=True)
+        self.heartbeat.start()
+
+    def stop(self, timeout: float | None = None):
+        """
+        Stop the scheduler and release its lease
+        :param timeout: Maximum seconds to wait for a running task
+        """
+        self.stopped.set()
+        for thread in (self.thread, self.heartbeat):
+            if thread is not None:
+                thread.join(timeout)
+        self.store.release_lease(self.name, self.owner)
+
+    def next_delay(self) -> float:
+        backoff = min(2 ** self.failures, self.max_backoff)
+        return self.interval * backoff * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def run_once(self) -> bool:
+        """
+        Run the task if this scheduler holds the lease
+        :return: True if the task ran
+        """
+        if not self.store.acquire_lease(self.name, self.owner, self.lease_ttl):
+            return False
+
+        try:
+            self.task()
+            self.failures = 0
+        except Exception as e:
+            self.failures += 1
+            logging.error(f"Scheduled {self.name} failed ({self.failures} in a row): {e}")
+
+        return True
+
+    def _loop(self):
+        while not self.stopped.wait(self.next_delay()):
+            try:
+                self.run_once()
+            except Exception as e:
+                logging.error(f"Scheduler {self.name} failed: {e}")
+
+    def _renew_lease(self):
+        # Renewing fails harmlessly while another scheduler holds the lease
+        while not self.stopped.wait(self.lease_ttl / 3):
+            try:
+                self.store.renew_lease(self.name, self.owner, self.lease_ttl)
+            except Exception as e:
+                logging.warning(f"Failed to renew lease of scheduler {self.name}: {e}")
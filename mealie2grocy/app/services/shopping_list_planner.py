@@ -0,0 +1,91 @@
+from models.grocy import GrocyShoppingListItem
+from models.ingredient import Ingredient
+
+INSERT = "insert"
+UPDATE = "update"
+NOOP = "noop"
+
+# Smaller differences are rounding noise and do not justify a write
+MIN_AMOUNT = 0.05
+
+
+class ShoppingListOperation:
+    def __init__(self, action: str, ingredient: Ingredient, amount: float, item_id=None, previous_amount: float = 0):
+        """
+        :param action: One of INSERT, UPDATE and NOOP
+        :param amount: Amount of the new row for INSERT, new amount of the existing row for UPDATE
+        :param item_id: Existing shopping list row for UPDATE and NOOP
+        :param previous_amount: Amount of the existing row
+        """
+        self.action = action
+        self.ingredient = ingredient
+        self.amount = amount
+        self.item_id = item_id
+        self.previous_amount = previous_amount
+
+    def __str__(self):
+        return f"{self.action} {self.ingredient.name}: {self.previous_amount} -> {self.amount}"
+
+    def to_dict(self):
+        return {
+            "action": self.action,
+            "product_id": self.ingredient.gid,
+            "name": self.ingredient.name,
+            "amount": self.amount,
+            "previous_amount": self.previous_amount,
+            "item_id": self.item_id,
+        }
+
+
+class ShoppingListPlan:
+    """
+    Operations that bring the grocy shopping list to the desired state with as few writes as possible
+    """
+
+    def __init__(self, operations: list[ShoppingListOperation] | None = None):
+        self.operations: list[ShoppingListOperation] = operations or []
+
+    @property
+    def writes(self) -> list[ShoppingListOperation]:
+        return [operation for operation in self.operations if operation.action != NOOP]
+
+    def count(self, action: str) -> int:
+        return sum(1 for operation in self.operations if operation.action == action)
+
+    def to_dict(self):
+        return {
+            "operations": [operation.to_dict() for operation in self.operations],
+            INSERT: self.count(INSERT),
+            UPDATE: self.count(UPDATE),
+            NOOP: self.count(NOOP),
+        }
+
+
+def plan_shopping_list(missing: list[tuple[Ingredient, float]], items: list[GrocyShoppingListItem]) -> ShoppingListPlan:
+    """
+    Plan the writes for amounts missing on the grocy shopping list.
+
+    A product that is already on the list gets its first row increased, which keeps the row's id, note and
+    unit and needs a single write. Other products get a new row.
+    :param missing: Ingredient and the amount that has to be added to the list
+    :param items: Open rows of the grocy shopping list
+    :return: Plan with one operation per ingredient
+    """
+    rows: dict[int, GrocyShoppingListItem] = {}
+    for item in items:
+        rows.setdefault(item.product_id, item)
+
+    plan = ShoppingListPlan()
+    for ingredient, amount in missing:
+        row = rows.get(ingredient.gid)
+        previous_amount = row.amount if row else 0
+        item_id = row.id if row else None
+
+        if amount <= MIN_AMOUNT:
+            plan.operations.append(ShoppingListOperation(NOOP, ingredient, previous_amount, item_id, previous_amount))
+        elif row is None:
+            plan.operations.append(ShoppingListOperation(INSERT, ingredient, amount))
+        else:
+            plan.operations.append(ShoppingListOperation(UPDATE, ingredient, round(previous_amount + amount, 2), item_id, previous_amount))
+
+    return plan
@@ -0,0 +1,88 @@
+from models.ingredient import Ingredient
+
+
+class ShoppingListChanges:
+    """
+    Difference between the mealie shopping list and what earlier syncs transferred to grocy.
+
+    Every transferred mealie item is stored with its amount, unit and grocy product. An item is pending if
+    it is new or one of them changed since. Only products with pending items are recomputed, so an unchanged
+    list causes no writes, and items that were already transferred are not added a second time, e.g. after
+    their amount was bought and left the grocy shopping list.
+    """
+
+    def __init__(self, ingredients: list[Ingredient], synced: dict[str, dict], item_ids: set[str] | None = None):
+        """
+        :param ingredients: Mealie shopping list items, matched with grocy products
+        :param synced: Stored items by mealie item id, see StateStore.get_shopping_list_items
+        :param item_ids: Ids the ingredients were loaded for in a partial sync, None if they are the whole shopping list.
+            Stored items that were requested but not loaded were removed or checked.
+        """
+        self.synced = synced
+        self.added: list[Ingredient] = []
+        self.changed: list[Ingredient] = []
+        self.unchanged: list[Ingredient] = []
+
+        # Entries to store for pending items once they reached grocy
+        self.entries: dict[str, dict] = {}
+
+        for ingredient in ingredients:
+            entry = synced.get(ingredient.mid) if ingredient.mid is not None else None
+            if entry is None:
+                self.added.append(ingredient)
+            elif (entry["product_id"], entry["amount"], entry["unit"]) != (ingredient.gid, ingredient.amount, ingredient.unit):
+                self.changed.append(ingredient)
+            else:
+                self.unchanged.append(ingredient)
+
+        self._pending = {id(ingredient) for ingredient in self.pending}
+
+        loaded_ids = {ingredient.mid for ingredient in ingredients}
+        missing_ids = [mealie_id for mealie_id in synced if mealie_id not in loaded_ids]
+
+        self.removed: list[str] = [mealie_id for mealie_id in missing_ids if item_ids is None or mealie_id in item_ids]
+        # Items outside of a partial sync still count for the amount of their product
+        self.other: list[str] = [] if item_ids is None else [mealie_id for mealie_id in missing_ids if mealie_id not in item_ids]
+
+    @property
+    def pending(self) -> list[Ingredient]:
+        return self.added + self.changed
+
+    @property
+    def pending_products(self) -> set[int]:
+        return {ingredient.gid for ingredient in self.pending if ingredient.gid is not None}
+
+    def is_pending(self, ingredient: Ingredient) -> bool:
+        return id(ingredient) in self._pending
+
+    def other_ingredients(self, product_ids: set[int]) -> list[Ingredient]:
+        """
+        Stored items of the given products that are not part of this sync, in their converted unit
+        """
+        ingredients = []
+        for mealie_id in self.other:
+            entry = self.synced[mealie_id]
+            if entry["product_id"] in product_ids and entry["converted_amount"] is not None:
+                ingredients.append(Ingredient(entry["name"], entry["converted_amount"], entry["converted_unit"], mid=mealie_id, gid=entry["product_id"]))
+
+        return ingredients
+
+    def record(self, ingredient: Ingredient, converted: Ingredient | None = None):
+        """
+        Remember the state of a pending item, it is stored if its write succeeds
+        :param converted: The item in the stock unit of its grocy product, None for items without product
+        """
+        if ingredient.mid is None or not self.is_pending(ingredient):
+            return
+
+        self.entries[ingredient.mid] = {
+            "product_id": ingredient.gid,
+            "name": ingredient.name,
+            "amount": ingredient.amount,
+            "unit": ingredient.unit,
+            "converted_amount": converted.amount if converted else None,
+            "converted_unit": converted.unit if converted else None,
+        }
+
+    def __str__(self):
+        return f"{len(self.added)} added, {len(self.changed)} changed, {len(self.unchanged)} unchanged, {len(self.removed)} removed"
@@ -0,0 +1,221 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+
+class StateStore:
+    """
+    Local SQLite database for state that has to survive restarts and is shared by all gunicorn workers.
+
+    Every operation opens its own short-lived connection, so the store can be used from any thread or process.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                CREATE TABLE IF NOT EXISTS product_hashes (
+                    product_id INTEGER PRIMARY KEY,
+                    hash TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS job_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    data TEXT
+                );
+                CREATE INDEX IF NOT EXISTS job_events_job_id ON job_events (job_id, id);
+                CREATE TABLE IF NOT EXISTS shopping_list_items (
+                    mealie_id TEXT PRIMARY KEY,
+                    product_id INTEGER,
+                    name TEXT NOT NULL,
+                    amount REAL NOT NULL,
+                    unit TEXT,
+                    converted_amount REAL,
+                    converted_unit TEXT,
+                    written INTEGER NOT NULL DEFAULT 0,
+                    synced_at REAL NOT NULL
+                );
+            """)
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def get_meta(self, key: str) -> str | None:
+        with self._connect() as connection:
+            row = connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+
+        return row["value"] if row else None
+
+    def set_meta(self, key: str, value: str | None):
+        with self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def get_product_hashes(self) -> dict[int, str]:
+        with self._connect() as connection:
+            rows = connection.execute("SELECT product_id, hash FROM product_hashes").fetchall()
+
+        return {row["product_id"]: row["hash"] for row in rows}
+
+    def update_product_hashes(self, hashes: dict[int, str], removed_product_ids=()):
+        with self._connect() as connection:
+            connection.executemany("INSERT OR REPLACE INTO product_hashes (product_id, hash) VALUES (?, ?)", hashes.items())
+            connection.executemany("DELETE FROM product_hashes WHERE product_id = ?", [(product_id,) for product_id in removed_product_ids])
+
+    def get_shopping_list_items(self) -> dict[str, dict]:
+        """
+        Mealie shopping list items as they were last transferred to grocy
+        :return: Dict of mealie item id to product_id, name, amount, unit, converted_amount, converted_unit and written,
+            whether the item caused a write to grocy
+        """
+        with self._connect() as connection:
+            rows = connection.execute("SELECT mealie_id, product_id, name, amount, unit, converted_amount, converted_unit, written FROM shopping_list_items").fetchall()
+
+        return {row["mealie_id"]: {**{key: row[key] for key in row.keys() if key != "mealie_id"}, "written": bool(row["written"])} for row in rows}
+
+    def update_shopping_list_items(self, items: dict[str, dict], removed_ids=()):
+        now = time.time()
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO shopping_list_items (mealie_id, product_id, name, amount, unit, converted_amount, converted_unit, written, synced_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(mealie_id, item["product_id"], item["name"], item["amount"], item["unit"], item["converted_amount"], item["converted_unit"],
+                  item.get("written", False), now)
+                 for mealie_id, item in items.items()])
+            connection.executemany("DELETE FROM shopping_list_items WHERE mealie_id = ?", [(mealie_id,) for mealie_id in removed_ids])
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """
+        Take a named lease if it is free or expired. The check and the write run in one transaction, so
+        exactly one of several concurrent processes gets the lease.
+        :return: True if the lease now belongs to owner
+        """
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row["owner"] != owner and row["expires_at"] > now:
+                return False
+
+            connection.execute("INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)", (name, owner, now + ttl))
+            return True
+
+    def renew_lease(self, name: str, owner: str, ttl: float) -> bool:
+        with self._connect() as connection:
+            cursor = connection.execute("UPDATE leases SET expires_at = ? WHERE name = ? AND owner = ?", (time.time() + ttl, name, owner))
+            return cursor.rowcount == 1
+
+    def release_lease(self, name: str, owner: str):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def get_lease_owner(self, name: str) -> str | None:
+        with self._connect() as connection:
+            row = connection.execute("SELECT owner FROM leases WHERE name = ? AND expires_at > ?", (name, time.time())).fetchone()
+
+        return row["owner"] if row else None
+
+    def create_job(self, job_id: str, kind: str, status: str):
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute("INSERT INTO jobs (id, kind, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)", (job_id, kind, status, now, now))
+
+    def update_job(self, job_id: str, **fields):
+        """
+        Update status, progress, result or error of a job, the result is stored as JSON
+        """
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = time.time()
+
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as connection:
+            connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get_job(self, job_id: str) -> dict | None:
+        with self._connect() as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+        if row is None:
+            return None
+
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def finish_job(self, job_id: str, status: str, result=None, error: str | None = None):
+        """
+        Set the final status of a job and record it as event in one transaction, so followers never see
+        the status without the event
+        """
+        with self._connect() as connection:
+            connection.execute("UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                               (status, json.dumps(result), error, time.time(), job_id))
+            connection.execute("INSERT INTO job_events (job_id, event, data) VALUES (?, ?, ?)",
+                               (job_id, status, json.dumps(result if error is None else error)))
+
+    def add_job_event(self, job_id: str, event: str, data=None) -> int:
+        with self._connect() as connection:
+            cursor = connection.execute("INSERT INTO job_events (job_id, event, data) VALUES (?, ?, ?)", (job_id, event, json.dumps(data)))
+            return cursor.lastrowid
+
+    def get_job_events(self, job_id: str, after_id: int = 0) -> list[dict]:
+        """
+        Events of a job in the order they were added
+        :param after_id: Only return events with a larger id
+        """
+        with self._connect() as connection:
+            rows = connection.execute("SELECT id, event, data FROM job_events WHERE job_id = ? AND id > ? ORDER BY id", (job_id, after_id)).fetchall()
+
+        return [{"id": row["id"], "event": row["event"], "data": json.loads(row["data"])} for row in rows]
+
+    def fail_stale_jobs(self, kind: str, statuses: tuple[str, ...], error: str):
+        """
+        Mark unfinished jobs of a kind as failed, used when their worker disappeared without releasing its lease
+        """
+        placeholders = ", ".join("?" for _ in statuses)
+        with self._connect() as connection:
+            connection.execute(f"UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE kind = ? AND status IN ({placeholders})",
+                               (error, time.time(), kind, *statuses))
+
+    def delete_jobs_before(self, timestamp: float):
+        """
+        Delete finished jobs and their events that were last updated before a point in time
+        """
+        with self._connect() as connection:
+            connection.execute("DELETE FROM job_events WHERE job_id IN (SELECT id FROM jobs WHERE updated_at < ? AND status IN ('done', 'failed'))", (timestamp,))
+            connection.execute("DELETE FROM jobs WHERE updated_at < ? AND status IN ('done', 'failed')", (timestamp,))
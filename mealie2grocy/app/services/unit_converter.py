@@ -5,6 +5,7 @@ from models.grocy import GrocyStockItem
 from models.ingredient import Ingredient
 from services.grocy_service import GrocyInstance
 from services.mealie_service import MealieInstance
+from services.unit_graph import UnitGraph
 
 
 class UnitConverter:
@@ -13,42 +14,61 @@ class UnitConverter:
         self.grocy = grocy
         self.mealie = mealie
 
-        self.conversion_factors: dict[Tuple[str, str], float] = {}
+        self.graph = UnitGraph({})
+        self.conversion_factors: dict[Tuple[str, str], float] = {}  # All reachable conversions of the generic graph
         self.grocy_to_mealie_unit_names: dict[str, str] = {}  # To enable matching grocy unit conversions to mealie units
+        self.product_conversions: dict[int, dict[Tuple[str, str], float]] = {}  # Resolved conversions per product id
+        self.product_graphs: dict[int, UnitGraph] = {}  # Generic graph with product conversions on top
         self._update_conversions()
 
     def _update_conversions(self):
         grocy_units = self.grocy.get_units().values()
         mealie_units = self.mealie.get_units()
 
-        self.conversion_factors: dict[Tuple[str, str], float] = {}
+        grocy_units_by_name = {grocy_unit.name: grocy_unit for grocy_unit in grocy_units}
+        edges: dict[Tuple[str, str], float] = {}
 
-        # Direct mappings
+        # Direct mappings, matched by name or abbreviation
         for mealie_unit in mealie_units:
-            match = False
+            grocy_unit = grocy_units_by_name.get(mealie_unit.name)
+            if grocy_unit is None and mealie_unit.abbreviation is not None:
+                grocy_unit = grocy_units_by_name.get(mealie_unit.abbreviation)
 
-            for grocy_unit in grocy_units:
-                if mealie_unit.name == grocy_unit.name:
-                    match = True
-                elif mealie_unit.abbreviation == grocy_unit.name:
-                    match = True
+            if grocy_unit is not None:
+                edges[(mealie_unit.name, grocy_unit.name)] = 1
+                self.grocy_to_mealie_unit_names[grocy_unit.name] = mealie_unit.name
 
-                if match:
-                    self.conversion_factors[(mealie_unit.name, grocy_unit.name)] = 1
-                    self.grocy_to_mealie_unit_names[grocy_unit.name] = mealie_unit.name
-                    break
-
-            if not match:
-                if not (mealie_unit.name in self.units_that_refer_to_any_amount
-                        or mealie_unit.name in self.units_that_refer_to_one_piece):
-                    raise ValueError(f"Could not find matching unit for {mealie_unit.name}")
+            elif not (mealie_unit.name in self.units_that_refer_to_any_amount
+                      or mealie_unit.name in self.units_that_refer_to_one_piece):
+                raise ValueError(f"Could not find matching unit for {mealie_unit.name}")
 
         # Add conversions from grocy
-        for conversion, factor in self.grocy.get_unit_conversions().items():
-            from_unit = self.grocy_to_mealie_unit_names.get(conversion[0], conversion[0])
-            to_unit = self.grocy_to_mealie_unit_names.get(conversion[1], conversion[1])
+        edges.update(self.grocy.get_unit_conversions())
+
+        self.graph = UnitGraph(edges)
+        self.conversion_factors = self.graph.closure
+        self.product_graphs = {}
+
+    def prefetch_product_conversions(self, product_ids):
+        """
+        Load the resolved conversions of all products of a sync with a single request
+        :param product_ids: Grocy product ids that may need a product specific conversion
+        """
+        missing = {product_id for product_id in product_ids if product_id not in self.product_conversions}
+        if missing:
+            self.product_conversions.update(self.grocy.get_unit_conversions_resolved(missing))
+
+    def _get_product_conversions(self, product_id) -> dict[Tuple[str, str], float]:
+        if product_id not in self.product_conversions:
+            self.product_conversions[product_id] = self.grocy.get_unit_conversion_resolved(product_id)
 
-            self.conversion_factors[(from_unit, to_unit)] = factor
+        return self.product_conversions[product_id]
+
+    def _get_product_graph(self, product_id) -> UnitGraph:
+        if product_id not in self.product_graphs:
+            self.product_graphs[product_id] = self.graph.with_overlay(self._get_product_conversions(product_id))
+
+        return self.product_graphs[product_id]
 
     units_that_refer_to_any_amount = ['Prise', 'Schuss', 'Spritzer', 'Portion', 'Scheibe', 'Esslöffel', 'Teelöffel']
     units_that_refer_to_one_piece = ['Kopf', 'Bund']
@@ -76,20 +96,12 @@ class UnitConverter:
             result_unit = target_stock_item.stock_unit
 
         else:
-            # Check if generic conversion is possible
-            if (source_ingredient.unit, target_stock_item.stock_unit) in self.conversion_factors:
-                result_amount = source_ingredient.amount * self.conversion_factors[(source_ingredient.unit, target_stock_item.stock_unit)]
-                result_unit = target_stock_item.stock_unit
+            # Product specific conversions take precedence, the product graph contains the generic conversions as well
+            factor = self._get_product_graph(target_stock_item.id).factor(source_ingredient.unit, target_stock_item.stock_unit)
 
-            # Check if conversion via custom stock unit is possible
-            else:
-                conversions = self.grocy.get_unit_conversion_resolved(target_stock_item.id)
-
-                for (from_unit, to_unit), factor in conversions.items():
-                    if from_unit in self.grocy_to_mealie_unit_names and self.grocy_to_mealie_unit_names[from_unit] == source_ingredient.unit and to_unit == target_stock_item.stock_unit:
-                        result_amount = source_ingredient.amount * factor
-                        result_unit = to_unit
-                        break
+            if factor is not None:
+                result_amount = source_ingredient.amount * factor
+                result_unit = target_stock_item.stock_unit
 
         if result_unit is None:
             logging.error(f"Could not convert {source_ingredient.unit} to {target_stock_item.stock_unit} for product {target_stock_item.name}")
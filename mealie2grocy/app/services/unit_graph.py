@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict, deque
+from typing import Tuple
+
+
+class UnitGraph:
+    """
+    Weighted graph of unit conversions.
+
+    Edges are direct conversion factors, the inverse direction is added if it is not given explicitly.
+    The transitive closure is computed once on construction, so any reachable pair (e.g. g -> kg -> Pack)
+    is a dictionary lookup afterwards.
+    """
+
+    _closure_cache: OrderedDict[frozenset, dict[Tuple[str, str], float]] = OrderedDict()
+    _closure_cache_size = 64
+    _closure_cache_lock = threading.Lock()
+
+    def __init__(self, edges: dict[Tuple[str, str], float]):
+        self.edges = dict(edges)
+        self.closure = self._get_closure(self.edges)
+
+    def factor(self, from_unit: str, to_unit: str) -> float | None:
+        """
+        Get the factor to convert from_unit to to_unit
+        :return: Factor or None if the units are not connected
+        """
+        return self.closure.get((from_unit, to_unit))
+
+    def with_overlay(self, edges: dict[Tuple[str, str], float]) -> 'UnitGraph':
+        """
+        Create a graph with additional edges, e.g. product specific conversions. Overlay edges take precedence.
+        """
+        if not edges:
+            return self
+
+        return UnitGraph({**self.edges, **edges})
+
+    @classmethod
+    def _get_closure(cls, edges: dict[Tuple[str, str], float]) -> dict[Tuple[str, str], float]:
+        # The edge set identifies the catalog version, so an unchanged catalog reuses its closure
+        key = frozenset(edges.items())
+
+        with cls._closure_cache_lock:
+            if key in cls._closure_cache:
+                cls._closure_cache.move_to_end(key)
+                return cls._closure_cache[key]
+
+        closure = cls._compute_closure(edges)
+
+        with cls._closure_cache_lock:
+            cls._closure_cache[key] = closure
+            while len(cls._closure_cache) > cls._closure_cache_size:
+                cls._closure_cache.popitem(last=False)
+
+        return closure
+
+    @staticmethod
+    def _compute_closure(edges: dict[Tuple[str, str], float]) -> dict[Tuple[str, str], float]:
+        adjacency: dict[str, dict[str, float]] = {}
+        for (from_unit, to_unit), factor in edges.items():
+            if from_unit == to_unit:
+                continue
+            adjacency.setdefault(from_unit, {})[to_unit] = factor
+
+        for (from_unit, to_unit), factor in edges.items():
+            if from_unit == to_unit or not factor:
+                continue
+            if from_unit not in adjacency.get(to_unit, {}):
+                adjacency.setdefault(to_unit, {})[from_unit] = 1 / factor
+
+        # Breadth-first search from every unit prefers the conversion with the fewest steps
+        closure = {}
+        for start in adjacency:
+            factors = {start: 1}
+            queue = deque([start])
+            while queue:
+                unit = queue.popleft()
+                for neighbour, factor in adjacency.get(unit, {}).items():
+                    if neighbour not in factors:
+                        factors[neighbour] = factors[unit] * factor
+                        queue.append(neighbour)
+
+            for unit, factor in factors.items():
+                if unit != start:
+                    closure[(start, unit)] = factor
+
+        return closure
@@ -0,0 +1,37 @@
+import json
+
+# Key for events that do not name the affected shopping list items, they trigger a full sync
+FULL_SYNC = "*"
+
+
+def affected_items(payload) -> set[str]:
+    """
+    Find the mealie shopping list items an event is about
+    :param payload: Body of a mealie notifier event, or any other notification (grocy, Home Assistant)
+    :return: Ids of the affected items, or {FULL_SYNC} if the event does not name any
+    """
+    if not isinstance(payload, dict):
+        return {FULL_SYNC}
+
+    document = payload.get("document_data") or payload.get("documentData")
+
+    # The apprise json:// notifier of mealie sends the document as JSON encoded string
+    if isinstance(document, str):
+        try:
+            document = json.loads(document)
+        except json.JSONDecodeError:
+            return {FULL_SYNC}
+
+    if not isinstance(document, dict):
+        return {FULL_SYNC}
+
+    item_ids = document.get("shopping_list_item_ids", document.get("shoppingListItemIds"))
+    if not item_ids or not isinstance(item_ids, list):
+        return {FULL_SYNC}
+
+    # Bulk events contain objects instead of plain ids
+    ids = {str(item.get("id")) if isinstance(item, dict) else str(item) for item in item_ids}
+    if "None" in ids:
+        return {FULL_SYNC}
+
+    return ids
@@ -10,6 +10,9 @@ export MEALIE_API_KEY="$(bashio::config 'MEALIE_API_KEY')"
 export GROCY_BASE_URL="$(bashio::config 'GROCY_BASE_URL')"
 export GROCY_API_KEY="$(bashio::config 'GROCY_API_KEY')"
 export API_KEYS="$(bashio::config 'API_KEYS')"
+export SYNC_INTERVAL="$(bashio::config 'SYNC_INTERVAL')"
+export MEALIE_SHOPPING_LIST_CLEANUP="$(bashio::config 'MEALIE_SHOPPING_LIST_CLEANUP')"
 
 cd /app
-exec gunicorn -w 4 -b 0.0.0.0:9193 --access-logfile - wsgi:app
\ No newline at end of file
+# Threads keep workers responsive while progress streams are open
+exec gunicorn -w 4 --threads 4 -b 0.0.0.0:9193 --access-logfile - wsgi:app
\ No newline at end of file
@@ -0,0 +1,94 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from services.cache import ChangeAwareCache, CatalogCache
+
+
+class TestChangeAwareCache(unittest.TestCase):
+
+    def setUp(self):
+        self.version = "v1"
+        self.version_loader = MagicMock(side_effect=lambda: self.version)
+        self.cache = ChangeAwareCache(self.version_loader, ttl=60, max_entries=2, revalidate_interval=0)
+
+    def test_hit_when_version_unchanged(self):
+        loader = MagicMock(return_value=[1, 2])
+
+        self.assertEqual(self.cache.get("products", loader), [1, 2])
+        self.assertEqual(self.cache.get("products", loader), [1, 2])
+
+        loader.assert_called_once()
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_reload_when_version_changed(self):
+        loader = MagicMock(side_effect=[[1], [1, 2]])
+
+        self.cache.get("products", loader)
+        self.version = "v2"
+
+        self.assertEqual(self.cache.get("products", loader), [1, 2])
+        self.assertEqual(loader.call_count, 2)
+
+    def test_reload_when_expired(self):
+        loader = MagicMock(return_value=[1])
+
+        with patch('services.cache.time.monotonic', side_effect=[0, 0, 100, 100]):
+            self.cache.get("products", loader)
+            self.cache.get("products", loader)
+
+        self.assertEqual(loader.call_count, 2)
+
+    def test_revalidate_interval_limits_version_checks(self):
+        cache = ChangeAwareCache(self.version_loader, ttl=60, max_entries=2, revalidate_interval=60)
+
+        for _ in range(5):
+            cache.get("products", lambda: [1])
+
+        self.version_loader.assert_called_once()
+
+    def test_evicts_least_recently_used(self):
+        self.cache.get("a", lambda: 1)
+        self.cache.get("b", lambda: 2)
+        self.cache.get("a", lambda: 1)
+        self.cache.get("c", lambda: 3)
+
+        loader = MagicMock(return_value=2)
+        self.cache.get("b", loader)
+        loader.assert_called_once()
+        self.assertEqual(len(self.cache), 2)
+
+    def test_concurrent_misses_load_once(self):
+        cache = ChangeAwareCache(self.version_loader, ttl=60, max_entries=2, revalidate_interval=60)
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(.05)
+            return [1]
+
+        threads = [threading.Thread(target=cache.get, args=("products", loader)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.version_loader.assert_called_once()
+
+
+class TestCatalogCache(unittest.TestCase):
+
+    def test_rebuilds_only_for_new_version(self):
+        cache = CatalogCache()
+        build = MagicMock(side_effect=lambda: object())
+
+        first = cache.get(((1, "Mehl"),), build)
+        self.assertIs(cache.get(((1, "Mehl"),), build), first)
+        self.assertIsNot(cache.get(((1, "Weizenmehl"),), build), first)
+        self.assertEqual(build.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
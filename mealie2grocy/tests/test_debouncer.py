@@ -0,0 +1,56 @@
+import threading
+import time
+import unittest
+
+from services.debouncer import Debouncer
+
+
+class TestDebouncer(unittest.TestCase):
+
+    def setUp(self):
+        self.batches = []
+        self.flushed = threading.Event()
+
+    def flush(self, keys):
+        self.batches.append(keys)
+        self.flushed.set()
+
+    def test_burst_is_flushed_once(self):
+        debouncer = Debouncer(.05, self.flush)
+
+        for key in ("a", "b", "a"):
+            debouncer.add({key})
+
+        self.assertTrue(self.flushed.wait(2))
+        time.sleep(.1)
+        self.assertEqual(self.batches, [{"a", "b"}])
+
+    def test_max_wait_limits_delay(self):
+        debouncer = Debouncer(.1, self.flush, max_wait=.2)
+
+        start = time.monotonic()
+        while not self.flushed.is_set() and time.monotonic() - start < 2:
+            debouncer.add({"a"})
+            time.sleep(.02)
+
+        self.assertTrue(self.flushed.is_set())
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_failed_flush_does_not_stop_debouncer(self):
+        def flush(keys):
+            self.flush(keys)
+            raise Exception("Failed to get shopping list from grocy")
+
+        debouncer = Debouncer(.01, flush)
+
+        debouncer.add({"a"})
+        self.assertTrue(self.flushed.wait(2))
+        self.flushed.clear()
+
+        debouncer.add({"b"})
+        self.assertTrue(self.flushed.wait(2))
+        self.assertEqual(self.batches, [{"a"}, {"b"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
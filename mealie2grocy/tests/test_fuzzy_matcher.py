@@ -0,0 +1,55 @@
+import time
+import unittest
+
+from models.grocy import GrocyProductItem
+from services.fuzzy_matcher import FuzzyMatcher, trigrams
+
+
+class TestFuzzyMatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.products = [
+            GrocyProductItem(1, "Tomaten, gehackt"),
+            GrocyProductItem(2, "Tomate"),
+            GrocyProductItem(3, "Tomatenmark"),
+            GrocyProductItem(4, "Milch"),
+        ]
+        self.matcher = FuzzyMatcher(self.products)
+
+    def test_trigrams(self):
+        self.assertEqual(trigrams("ei"), {"  e", " ei", "ei "})
+
+    def test_suggest_for_free_text_note(self):
+        suggestions = self.matcher.suggest("2 Dosen Tomaten")
+        self.assertIn(suggestions[0][0].id, (1, 2, 3))
+        self.assertNotIn(4, [product.id for product, _ in suggestions])
+
+    def test_suggest_typo(self):
+        self.assertEqual(self.matcher.suggest_names("Milhc", limit=1), ["Milch"])
+        self.assertEqual(self.matcher.suggest_names("Vollmilch", limit=1), ["Milch"])
+
+    def test_suggest_ranking(self):
+        scores = [score for _, score in self.matcher.suggest("Tomate")]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(self.matcher.suggest("Tomate")[0][0].id, 2)
+
+    def test_no_suggestions(self):
+        self.assertEqual(self.matcher.suggest(""), [])
+        self.assertEqual(self.matcher.suggest("123"), [])
+        self.assertEqual(self.matcher.suggest("Xylophon"), [])
+
+    def test_large_catalog(self):
+        products = [GrocyProductItem(i, f"Produkt {i} Sorte {i % 97}") for i in range(20000)]
+        products.append(GrocyProductItem(-1, "Kichererbsen"))
+        matcher = FuzzyMatcher(products)
+
+        start = time.perf_counter()
+        suggestions = matcher.suggest("1 Dose Kichererbse")
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(suggestions[0][0].id, -1)
+        self.assertLess(elapsed, 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,22 @@
+import json
 import unittest
+from unittest.mock import patch, MagicMock
+
 from models.grocy import GrocyProductItem, GrocyStockItem, GrocyUnit  # Replace with your actual module path
+from services.grocy_service import GrocyInstance
+
+
+def mock_grocy_api(routes: dict):
+    """Return a side effect for requests.Session.get answering by URL path"""
+    def get(url, **kwargs):
+        path = url.replace("http://fake-grocy.com", "")
+        response = MagicMock()
+        response.status_code = 200
+        response.text = json.dumps(routes[path])
+        return response
+
+    return get
+
 
 class TestGrocyProductItem(unittest.TestCase):
 
@@ -65,5 +82,160 @@ class TestGrocyUnit(unittest.TestCase):
         self.assertEqual(unit.mid, 1)
         self.assertEqual(unit.name, 'Liter')
 
+
+class TestGrocyInstance(unittest.TestCase):
+
+    def setUp(self):
+        self.grocy_instance = GrocyInstance(api_key='dummy_key', endpoint='http://fake-grocy.com')
+        self.routes = {
+            "/objects/products": [
+                {"id": 1, "name": "Flour", "description": None, "min_stock_amount": 1, "qu_id_stock": 10},
+                {"id": 2, "name": "Milk", "description": None, "min_stock_amount": 0, "qu_id_stock": 11},
+            ],
+            "/objects/quantity_units": [
+                {"id": 10, "name": "kg"},
+                {"id": 11, "name": "l"},
+            ],
+            "/stock": [
+                {"product_id": 1, "amount_aggregated": 3, "amount_opened_aggregated": 1},
+            ],
+            "/system/db-changed-time": {"changed_time": "2025-04-01 10:00:00"},
+        }
+
+    @patch('requests.Session.get')
+    def test_get_stock_snapshot(self, mock_get):
+        mock_get.side_effect = mock_grocy_api(self.routes)
+
+        stock_items = self.grocy_instance.get_stock_snapshot()
+
+        # Change check, products, units and stock
+        self.assertEqual(mock_get.call_count, 4)
+        self.assertEqual(stock_items[1].stock, 3)
+        self.assertEqual(stock_items[1].stock_opened, 1)
+        self.assertEqual(stock_items[1].stock_unit, "kg")
+        self.assertEqual(stock_items[2].stock, 0)
+        self.assertEqual(stock_items[2].stock_unit, "l")
+
+    @patch('requests.Session.get')
+    def test_get_shopping_list_ingredients_request_count(self, mock_get):
+        self.routes["/objects/shopping_list"] = [
+            {"product_id": 1, "qu_id": 10, "amount": 2, "done": 0},
+            {"product_id": 1, "qu_id": 10, "amount": 1, "done": 0},
+            {"product_id": 2, "qu_id": 11, "amount": 1, "done": 0},
+            {"product_id": 2, "qu_id": 11, "amount": 5, "done": 1},
+        ] * 50
+        mock_get.side_effect = mock_grocy_api(self.routes)
+
+        ingredients = self.grocy_instance.get_shopping_list_ingredients()
+
+        # Change check, products, units and shopping list
+        self.assertEqual(mock_get.call_count, 4)
+        self.assertEqual(ingredients[1].name, "Flour")
+        self.assertEqual(ingredients[1].amount, 150)
+        self.assertEqual(ingredients[1].unit, "kg")
+        self.assertEqual(ingredients[2].amount, 50)
+
+    @patch('requests.Session.get')
+    def test_get_shopping_list_ingredients_with_catalog(self, mock_get):
+        self.routes["/objects/shopping_list"] = [{"product_id": 2, "qu_id": 11, "amount": 1, "done": 0}]
+        mock_get.side_effect = mock_grocy_api(self.routes)
+
+        products = {2: GrocyProductItem(2, "Milk")}
+        units = {11: GrocyUnit(11, "l")}
+        ingredients = self.grocy_instance.get_shopping_list_ingredients(products, units)
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(ingredients[2].name, "Milk")
+        self.assertEqual(ingredients[2].unit, "l")
+
+    @patch('requests.Session.get')
+    def test_master_data_is_cached_until_grocy_changes(self, mock_get):
+        mock_get.side_effect = mock_grocy_api(self.routes)
+
+        self.grocy_instance.get_units()
+        self.grocy_instance.get_units()
+        self.assertEqual(mock_get.call_count, 2)
+
+        self.routes["/system/db-changed-time"] = {"changed_time": "2025-04-01 11:00:00"}
+        self.grocy_instance.cache.revalidate_interval = 0
+        self.grocy_instance.get_units()
+        self.assertEqual(mock_get.call_count, 4)
+
+    @patch('requests.Session.get')
+    def test_get_unit_conversions_resolved(self, mock_get):
+        self.routes["/objects/quantity_unit_conversions_resolved"] = [
+            {"product_id": 1, "from_qu_name": "g", "to_qu_name": "kg", "factor": 0.001},
+            {"product_id": 2, "from_qu_name": "ml", "to_qu_name": "l", "factor": 0.001},
+            {"product_id": 3, "from_qu_name": "Piece", "to_qu_name": "Pack", "factor": 0.1},
+        ]
+        mock_get.side_effect = mock_grocy_api(self.routes)
+
+        conversions = self.grocy_instance.get_unit_conversions_resolved([1, 2, 4])
+
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(conversions[1], {("g", "kg"): 0.001})
+        self.assertEqual(conversions[2], {("ml", "l"): 0.001})
+        self.assertEqual(conversions[4], {})
+        self.assertNotIn(3, conversions)
+
+    @patch('requests.Session.get')
+    def test_get_shopping_list_items_skips_done_rows(self, mock_get):
+        self.routes["/objects/shopping_list"] = [
+            {"id": 7, "product_id": 1, "qu_id": 10, "amount": 2, "done": 0, "note": "Organic"},
+            {"id": 8, "product_id": 2, "qu_id": 11, "amount": 5, "done": 1},
+        ]
+        mock_get.side_effect = mock_grocy_api(self.routes)
+
+        items = self.grocy_instance.get_shopping_list_items()
+
+        self.assertEqual([(item.id, item.amount, item.note) for item in items], [(7, 2, "Organic")])
+
+    @patch('requests.Session.put')
+    def test_update_shopping_list_item(self, mock_put):
+        mock_put.return_value = MagicMock(status_code=204)
+
+        self.grocy_instance.update_shopping_list_item(7, 3.5)
+
+        url = mock_put.call_args.args[0]
+        self.assertEqual(url, "http://fake-grocy.com/objects/shopping_list/7")
+        self.assertEqual(json.loads(mock_put.call_args.kwargs["data"]), {"amount": 3.5})
+
+    @patch('requests.Session.put')
+    @patch('requests.Session.get')
+    def test_add_notes_to_shopping_list_single_write(self, mock_get, mock_put):
+        self.routes["/objects/shopping_lists/1"] = {"description": "Party<p>Salt</p><p>Basil: 1 bunch</p>"}
+        mock_get.side_effect = mock_grocy_api(self.routes)
+        mock_put.return_value = MagicMock(status_code=204)
+
+        self.grocy_instance.add_notes_to_shopping_list(["Basil", "Salt", "Pepper", "Pepper"])
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(mock_put.call_count, 1)
+        description = json.loads(mock_put.call_args.kwargs["data"])["description"]
+        self.assertEqual(description, "Party<p>Salt</p><p>Basil: 1 bunch</p><p>Basil</p><p>Pepper</p>")
+
+    @patch('requests.Session.put')
+    @patch('requests.Session.get')
+    def test_add_notes_to_shopping_list_without_changes(self, mock_get, mock_put):
+        self.routes["/objects/shopping_lists/1"] = {"description": "<p>Salt</p>"}
+        mock_get.side_effect = mock_grocy_api(self.routes)
+
+        self.grocy_instance.add_notes_to_shopping_list(["Salt"])
+
+        mock_put.assert_not_called()
+
+    @patch('requests.Session.put')
+    @patch('requests.Session.get')
+    def test_add_notes_to_shopping_list_keeps_newest(self, mock_get, mock_put):
+        self.routes["/objects/shopping_lists/1"] = {"description": "<p>Salt</p><p>Sugar</p>"}
+        mock_get.side_effect = mock_grocy_api(self.routes)
+        mock_put.return_value = MagicMock(status_code=204)
+
+        self.grocy_instance.add_notes_to_shopping_list(["Pepper"], max_notes=2)
+
+        description = json.loads(mock_put.call_args.kwargs["data"])["description"]
+        self.assertEqual(description, "<p>Sugar</p><p>Pepper</p>")
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
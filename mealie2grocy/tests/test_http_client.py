@@ -0,0 +1,60 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from services.http_client import HttpClient
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = self.headers.get("X-Test", "").encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_default_headers_are_sent(self):
+        client = HttpClient(headers={"X-Test": "hello"})
+        response = client.get(self.url)
+        self.assertEqual(response.text, "hello")
+
+    def test_connections_are_reused(self):
+        client = HttpClient()
+        for _ in range(5):
+            client.get(self.url)
+
+        stats = client.connection_stats()[f"127.0.0.1:{self.server.server_port}"]
+        self.assertEqual(stats["requests"], 5)
+        self.assertEqual(stats["connections"], 1)
+        self.assertEqual(stats["reused"], 4)
+
+    @patch('requests.Session.get')
+    def test_default_timeout(self, mock_get):
+        client = HttpClient(timeout=7)
+        client.get(self.url)
+        client.get(self.url, timeout=1)
+        self.assertEqual(mock_get.call_args_list[0].kwargs["timeout"], 7)
+        self.assertEqual(mock_get.call_args_list[1].kwargs["timeout"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -30,6 +30,35 @@ class TestIngredient(unittest.TestCase):
         self.assertEqual(ingredient1.amount, 150)
         self.assertEqual(ingredient1.note, "for cookies, for cake")
 
+    def test_aggregate_triple_duplicates(self):
+        ingredients = [
+            Ingredient(name="Sugar", amount=100, unit="g", gid=1),
+            Ingredient(name="Flour", amount=1, unit="kg", gid=2),
+            Ingredient(name="Sugar", amount=50, unit="g", gid=1),
+            Ingredient(name="Sugar", amount=25, unit="g", gid=1),
+            Ingredient(name="Sugar", amount=1, unit="kg", gid=1),
+        ]
+
+        aggregated = Ingredient.aggregate(ingredients)
+
+        self.assertEqual([(i.gid, i.unit, i.amount) for i in aggregated], [(1, "g", 175), (2, "kg", 1), (1, "kg", 1)])
+        self.assertEqual(ingredients[0].amount, 100)
+
+    def test_aggregate_large_list(self):
+        ingredients = [Ingredient(name=f"Product {i % 100}", amount=1, unit="g", gid=i % 100) for i in range(10000)]
+
+        aggregated = Ingredient.aggregate(ingredients)
+
+        self.assertEqual(len(aggregated), 100)
+        self.assertTrue(all(ingredient.amount == 100 for ingredient in aggregated))
+
+    def test_aggregate_large_list_without_duplicates(self):
+        ingredients = [Ingredient(name=f"Product {i}", amount=i, unit="g", gid=i) for i in range(10000)]
+
+        aggregated = Ingredient.aggregate(ingredients)
+
+        self.assertEqual([ingredient.amount for ingredient in aggregated], list(range(10000)))
+
     def test_from_mealie_json_valid(self):
         data = {
             "food": {"name": "Eggs", "id": 1},
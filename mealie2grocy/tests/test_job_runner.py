@@ -0,0 +1,106 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from services.job_runner import JobRunner, DONE, FAILED
+from services.state_store import StateStore
+
+
+def wait_for(runner: JobRunner, job_id: str, timeout: float = 2) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = runner.get(job_id)
+        # The lease is released right after the final state is written
+        if job["status"] in (DONE, FAILED) and runner.store.get_lease_owner(job["kind"]) != job_id:
+            return job
+        time.sleep(.01)
+    raise TimeoutError(job_id)
+
+
+class TestJobRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = StateStore(os.path.join(self.directory.name, "test.sqlite"))
+        self.runner = JobRunner(self.store, lease_ttl=5)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_job_result_and_progress(self):
+        def task(progress):
+            progress.phase("writing")
+            progress.line("Flour is added to the shopping list.")
+            return "Flour is added to the shopping list."
+
+        job_id, started = self.runner.submit("shoppinglist", task)
+        job = wait_for(self.runner, job_id)
+
+        self.assertTrue(started)
+        self.assertEqual(job["status"], DONE)
+        self.assertEqual(job["progress"], "writing")
+        self.assertEqual(job["result"], "Flour is added to the shopping list.")
+
+    def test_follow_streams_events_until_done(self):
+        release = threading.Event()
+
+        def task(progress):
+            progress.phase("fetching")
+            release.wait(2)
+            progress.line("Flour is added to the shopping list.")
+            return "done"
+
+        job_id, _ = self.runner.submit("shoppinglist", task)
+        events = self.runner.follow(job_id, poll_interval=.01)
+
+        self.assertEqual((next(events)["event"], self.runner.get(job_id)["status"]), ("phase", "running"))
+        release.set()
+
+        remaining = [(event["event"], event["data"]) for event in events]
+        self.assertEqual(remaining, [("line", "Flour is added to the shopping list."), ("done", "done")])
+
+        # Reconnecting clients only get the events after the last one they received
+        last_id = self.store.get_job_events(job_id)[-2]["id"]
+        self.assertEqual([event["event"] for event in self.runner.follow(job_id, last_id)], ["done"])
+        wait_for(self.runner, job_id)
+
+    def test_duplicate_submissions_are_coalesced(self):
+        release = threading.Event()
+
+        job_id, _ = self.runner.submit("shoppinglist", lambda progress: release.wait(2))
+        # A second runner stands for another gunicorn worker sharing the database
+        other_job_id, started = JobRunner(StateStore(self.store.path), lease_ttl=5).submit("shoppinglist", lambda progress: None)
+
+        self.assertFalse(started)
+        self.assertEqual(other_job_id, job_id)
+
+        release.set()
+        wait_for(self.runner, job_id)
+
+    def test_lease_is_released_after_failure(self):
+        def fail(progress):
+            raise Exception("Failed to get shopping list from grocy")
+
+        job_id, _ = self.runner.submit("shoppinglist", fail)
+        job = wait_for(self.runner, job_id)
+
+        self.assertEqual(job["status"], FAILED)
+        self.assertEqual(job["error"], "Failed to get shopping list from grocy")
+
+        job_id, started = self.runner.submit("shoppinglist", lambda progress: None)
+        self.assertTrue(started)
+        wait_for(self.runner, job_id)
+
+    def test_expired_lease_is_taken_over(self):
+        self.store.acquire_lease("shoppinglist", "dead-worker", ttl=-1)
+
+        job_id, started = self.runner.submit("shoppinglist", lambda progress: None)
+
+        self.assertTrue(started)
+        wait_for(self.runner, job_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,16 @@
+import os
+import tempfile
+import time
 import unittest
 from unittest.mock import patch, MagicMock
 
-from main import test_grocy_connection, test_mealie_connection, update_products_in_mealie, compare_product_databases
+from main import test_grocy_connection, test_mealie_connection, update_products_in_mealie, compare_product_databases, \
+    fetch_sync_inputs, plan_grocy_shoppinglist_from_mealie, transferred_mealie_items, sync_shoppinglist_if_changed, \
+    process_webhook_events, prepare_shopping_list_sync, record_synced_items
+from models.ingredient import Ingredient
+from models.grocy import GrocyProductItem, GrocyStockItem, GrocyShoppingListItem
+from services.shopping_list_planner import ShoppingListPlan, INSERT
+from services.state_store import StateStore
 
 
 class TestServiceFunctions(unittest.TestCase):
@@ -41,5 +50,237 @@ class TestServiceFunctions(unittest.TestCase):
         self.assertIn("Product2 missing in Grocy.", result)
         self.assertNotIn("Product3", result)
 
+    @patch('services.grocy_service.GrocyInstance.get_all_products')
+    @patch('services.mealie_service.MealieInstance.get_all_foods')
+    def test_compare_product_databases_suggestions(self, mock_mealie, mock_grocy):
+        m1, m2 = MagicMock(aliases=[], plural_name=None), MagicMock(aliases=[], plural_name=None)
+        m1.name, m2.name = 'Olivenoel', 'Olivenöl'
+
+        mock_grocy.return_value = [m1]
+        mock_mealie.return_value = [m2]
+
+        result = compare_product_databases()
+        self.assertIn("Olivenöl missing in Grocy.", result)
+        self.assertIn("Similar products: Olivenoel", result)
+
+    @patch('main.UnitConverter')
+    @patch('main.grocy')
+    @patch('main.mealie')
+    def test_fetch_sync_inputs_runs_concurrently(self, mock_mealie, mock_grocy, mock_converter):
+        def slow(value):
+            def fetch(*args):
+                time.sleep(.1)
+                return value
+            return fetch
+
+        mock_grocy.get_all_products.side_effect = slow(["products"])
+        mock_grocy.get_shopping_list_items.side_effect = slow([])
+        mock_grocy.get_stock_snapshot.side_effect = slow({})
+        mock_mealie.get_all_foods.side_effect = slow(["foods"])
+        mock_mealie.get_shopping_list_ingredients.side_effect = slow([])
+        mock_converter.side_effect = slow("converter")
+
+        start = time.perf_counter()
+        inputs = fetch_sync_inputs()
+        elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, .4)
+        self.assertEqual(inputs["grocy_products"], ["products"])
+        self.assertEqual(inputs["converter"], "converter")
+        mock_grocy.clear_checked_items_on_shopping_list.assert_called_once()
+
+    @patch('main.UnitConverter')
+    @patch('main.grocy')
+    @patch('main.mealie')
+    def test_fetch_sync_inputs_for_items(self, mock_mealie, mock_grocy, mock_converter):
+        mock_mealie.get_shopping_list_ingredients_by_id.return_value = ["ingredient"]
+
+        inputs = fetch_sync_inputs(item_ids={"a"})
+
+        self.assertEqual(inputs["ingredients"], ["ingredient"])
+        mock_mealie.get_shopping_list_ingredients_by_id.assert_called_once_with({"a"})
+        self.assertFalse(mock_mealie.get_shopping_list_ingredients.called)
+
+    @patch('main.get_state_store')
+    @patch('main.prepare_shopping_list_sync')
+    @patch('main.UnitConverter')
+    @patch('main.grocy')
+    @patch('main.mealie')
+    def test_plan_grocy_shoppinglist_writes_nothing(self, mock_mealie, mock_grocy, mock_converter, mock_prepare, mock_get_state_store):
+        mock_prepare.return_value = ("", [], ShoppingListPlan(), None)
+
+        result = plan_grocy_shoppinglist_from_mealie()
+
+        self.assertEqual(result["plan"]["operations"], [])
+        mock_grocy.clear_checked_items_on_shopping_list.assert_not_called()
+        mock_grocy.add_to_shopping_list.assert_not_called()
+        mock_grocy.update_shopping_list_item.assert_not_called()
+
+    def test_transferred_mealie_items(self):
+        ingredients = [
+            Ingredient("Flour", 1, "kg", mid="a", gid=1),
+            Ingredient("Milk", 1, "l", mid="b", gid=2),
+            Ingredient("Saffron", 1, None, mid="c"),
+        ]
+
+        self.assertEqual(transferred_mealie_items(ingredients, {1, 2, "notes"}), {"a", "b", "c"})
+        self.assertEqual(transferred_mealie_items(ingredients, {1}), {"a"})
+
+    @patch('main._update_grocy_shoppinglist')
+    @patch('main.get_state_store')
+    @patch('main.grocy')
+    @patch('main.mealie')
+    def test_sync_shoppinglist_if_changed(self, mock_mealie, mock_grocy, mock_get_state_store, mock_update):
+        with tempfile.TemporaryDirectory() as directory:
+            mock_get_state_store.return_value = StateStore(os.path.join(directory, "test.sqlite"))
+            mock_grocy.get_db_changed_time.return_value = "2025-04-01 10:00:00"
+            mock_mealie.get_shopping_list_state.return_value = "3:2025-04-01T09:00:00"
+            mock_update.return_value = ("Flour is added to the shopping list.\n", True)
+
+            self.assertEqual(sync_shoppinglist_if_changed(), "Flour is added to the shopping list.\n")
+            self.assertIsNone(sync_shoppinglist_if_changed())
+
+            mock_mealie.get_shopping_list_state.return_value = "4:2025-04-01T11:00:00"
+            sync_shoppinglist_if_changed()
+            self.assertEqual(mock_update.call_count, 2)
+
+    @patch('main._update_grocy_shoppinglist')
+    @patch('main.get_state_store')
+    @patch('main.grocy')
+    @patch('main.mealie')
+    def test_sync_shoppinglist_if_changed_sees_items_added_during_sync(self, mock_mealie, mock_grocy, mock_get_state_store, mock_update):
+        with tempfile.TemporaryDirectory() as directory:
+            mock_get_state_store.return_value = StateStore(os.path.join(directory, "test.sqlite"))
+            mock_grocy.get_db_changed_time.return_value = "2025-04-01 10:00:00"
+            mock_mealie.get_shopping_list_state.side_effect = ["3:2025-04-01T09:00:00", "4:2025-04-01T09:01:00", "4:2025-04-01T09:01:00"]
+            mock_update.return_value = ("Flour is added to the shopping list.\n", True)
+
+            sync_shoppinglist_if_changed()
+            sync_shoppinglist_if_changed()
+            self.assertEqual(mock_update.call_count, 2)
+
+    @patch('main._update_grocy_shoppinglist')
+    @patch('main.get_state_store')
+    @patch('main.grocy')
+    @patch('main.mealie')
+    def test_sync_shoppinglist_if_changed_retries_failures(self, mock_mealie, mock_grocy, mock_get_state_store, mock_update):
+        with tempfile.TemporaryDirectory() as directory:
+            mock_get_state_store.return_value = StateStore(os.path.join(directory, "test.sqlite"))
+            mock_grocy.get_db_changed_time.return_value = "2025-04-01 10:00:00"
+            mock_mealie.get_shopping_list_state.return_value = "3:2025-04-01T09:00:00"
+            mock_update.return_value = ("Flour could not be written to Grocy\n", False)
+
+            sync_shoppinglist_if_changed()
+            sync_shoppinglist_if_changed()
+            self.assertEqual(mock_update.call_count, 2)
+
+    @patch('main.sync_shoppinglist_if_changed')
+    @patch('main.sync_mealie_items')
+    @patch('main.get_job_runner')
+    def test_process_webhook_events(self, mock_get_job_runner, mock_sync_items, mock_sync_all):
+        runner = mock_get_job_runner.return_value
+        runner.submit.return_value = ("job", True)
+
+        process_webhook_events({"a", "b"})
+        task = runner.submit.call_args.args[1]
+        task("progress")
+        mock_sync_items.assert_called_once_with({"a", "b"}, "progress")
+
+        process_webhook_events({"a", "*"})
+        runner.submit.call_args.args[1]("progress")
+        mock_sync_all.assert_called_once_with("progress")
+
+    @patch('main.get_job_runner')
+    def test_process_webhook_events_waits_for_running_sync(self, mock_get_job_runner):
+        runner = mock_get_job_runner.return_value
+        runner.submit.side_effect = [("running", False), ("scheduled", False), ("new", True)]
+
+        process_webhook_events({"a"})
+
+        self.assertEqual([call.args[0] for call in runner.wait.call_args_list], ["running", "scheduled"])
+        self.assertEqual(runner.submit.call_count, 3)
+
+    def sync_inputs(self, stock=0, shopping_list=()):
+        converter = MagicMock()
+        converter.convert.side_effect = lambda ingredient, stock_item: Ingredient(ingredient.name, ingredient.amount / 1000, "kg", mid=ingredient.mid, gid=ingredient.gid)
+        return {
+            "grocy_products": [GrocyProductItem(1, "Flour", None)],
+            "mealie_foods": [],
+            "converter": converter,
+            "ingredients": [Ingredient("Flour", 500, "g", mid="a"), Ingredient("Candles", 2, None, mid="b")],
+            "grocy_shopping_list": list(shopping_list),
+            "stock_items": {1: GrocyStockItem(1, "Flour", stock, 0, 0, 1, "kg")},
+        }
+
+    @patch('main.get_state_store')
+    def test_synced_items_are_not_added_twice(self, mock_get_state_store):
+        with tempfile.TemporaryDirectory() as directory:
+            store = mock_get_state_store.return_value = StateStore(os.path.join(directory, "test.sqlite"))
+
+            result, notes, plan, changes = prepare_shopping_list_sync(self.sync_inputs(), store.get_shopping_list_items())
+            self.assertEqual([(operation.action, operation.amount) for operation in plan.writes], [(INSERT, .5)])
+            self.assertEqual(notes, ["Candles: 2"])
+            self.assertEqual(record_synced_items(changes, plan, notes, set()), {"a", "b"})
+
+            # The flour was bought, the unchanged mealie list must not add it again
+            result, notes, plan, changes = prepare_shopping_list_sync(self.sync_inputs(stock=.5), store.get_shopping_list_items())
+            self.assertEqual(plan.operations, [])
+            self.assertEqual(notes, [])
+            self.assertEqual(record_synced_items(changes, plan, notes, set()), {"a", "b"})
+
+    @patch('main.get_state_store')
+    def test_changed_item_adds_difference(self, mock_get_state_store):
+        with tempfile.TemporaryDirectory() as directory:
+            store = mock_get_state_store.return_value = StateStore(os.path.join(directory, "test.sqlite"))
+
+            _, notes, plan, changes = prepare_shopping_list_sync(self.sync_inputs(), store.get_shopping_list_items())
+            record_synced_items(changes, plan, notes, set())
+
+            inputs = self.sync_inputs(shopping_list=[GrocyShoppingListItem(7, 1, .5, 1)])
+            inputs["ingredients"][0].amount = 800
+            _, _, plan, changes = prepare_shopping_list_sync(inputs, store.get_shopping_list_items())
+
+            self.assertEqual([(operation.item_id, operation.amount) for operation in plan.writes], [(7, .8)])
+            self.assertEqual(changes.changed, [inputs["ingredients"][0]])
+
+    @patch('main.get_state_store')
+    def test_failed_items_are_retried(self, mock_get_state_store):
+        with tempfile.TemporaryDirectory() as directory:
+            store = mock_get_state_store.return_value = StateStore(os.path.join(directory, "test.sqlite"))
+
+            _, notes, plan, changes = prepare_shopping_list_sync(self.sync_inputs(), store.get_shopping_list_items())
+            self.assertEqual(record_synced_items(changes, plan, notes, {1}), {"b"})
+
+            _, _, plan, changes = prepare_shopping_list_sync(self.sync_inputs(), store.get_shopping_list_items())
+            self.assertEqual(len(plan.writes), 1)
+            self.assertEqual([ingredient.mid for ingredient in changes.unchanged], ["b"])
+
+    @patch('main.get_state_store')
+    def test_items_in_stock_are_not_cleaned_up(self, mock_get_state_store):
+        with tempfile.TemporaryDirectory() as directory:
+            store = mock_get_state_store.return_value = StateStore(os.path.join(directory, "test.sqlite"))
+
+            _, notes, plan, changes = prepare_shopping_list_sync(self.sync_inputs(stock=1), store.get_shopping_list_items())
+            self.assertEqual(plan.writes, [])
+            self.assertEqual(record_synced_items(changes, plan, notes, set()), {"b"})
+
+            # Stored as processed, but still not written by an earlier sync
+            _, notes, plan, changes = prepare_shopping_list_sync(self.sync_inputs(stock=1), store.get_shopping_list_items())
+            self.assertEqual(changes.pending, [])
+            self.assertEqual(record_synced_items(changes, plan, notes, set()), {"b"})
+
+    @patch('main.FuzzyMatcher')
+    def test_fuzzy_matcher_is_built_once(self, mock_fuzzy):
+        mock_fuzzy.for_catalog.return_value.suggest_names.return_value = []
+        inputs = self.sync_inputs()
+        inputs["ingredients"].append(Ingredient("Matches", 1, None, mid="c"))
+
+        _, notes, _, _ = prepare_shopping_list_sync(inputs)
+
+        self.assertEqual(len(notes), 2)
+        mock_fuzzy.for_catalog.assert_called_once()
+        self.assertEqual(mock_fuzzy.for_catalog.return_value.suggest_names.call_count, 2)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
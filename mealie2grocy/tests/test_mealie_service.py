@@ -1,8 +1,11 @@
 import json
+import threading
 import unittest
 from unittest.mock import patch, MagicMock
 
+from models.grocy import GrocyProductItem
 from models.mealie import MealieFoodItem
+from config import MEALIE_PAGE_SIZE, MEALIE_BULK_BATCH_SIZE
 from services.mealie_service import MealieInstance
 
 
@@ -11,7 +14,7 @@ class TestMealieInstance(unittest.TestCase):
     def setUp(self):
         self.mealie_instance = MealieInstance(api_key='dummy_key', endpoint='http://fake-api.com')
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_all_foods(self, mock_get):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -28,7 +31,7 @@ class TestMealieInstance(unittest.TestCase):
         self.assertEqual(foods[0].name, "Apple")
         self.assertEqual(foods[1].name, "Banana")
 
-    @patch('requests.request')
+    @patch('requests.Session.post')
     def test_create_food_item_if_not_present(self, mock_post):
         existing_foods = [MealieFoodItem(1, "Apple", "Apples", "A tasty fruit", [])]
 
@@ -39,7 +42,7 @@ class TestMealieInstance(unittest.TestCase):
         self.mealie_instance.create_food_item_if_not_present(new_food, existing_foods)
         mock_post.assert_called_once()
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_create_food_item_if_present(self, mock_post):
         existing_foods = [MealieFoodItem(1, "Apple", "Apples", "A tasty fruit", [])]
 
@@ -48,7 +51,7 @@ class TestMealieInstance(unittest.TestCase):
         self.mealie_instance.create_food_item_if_not_present(existing_food, existing_foods)
         mock_post.assert_not_called()
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_week_plan(self, mock_get):
         mock_mealplan_response = MagicMock()
         mock_mealplan_response.status_code = 200
@@ -70,7 +73,7 @@ class TestMealieInstance(unittest.TestCase):
         self.assertEqual(len(week_plan), 1)
         self.assertEqual(week_plan[0].name, "Pasta")
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_shopping_list_ingredients(self, mock_get):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -88,8 +91,8 @@ class TestMealieInstance(unittest.TestCase):
         self.assertEqual(ingredients[0].amount, 5)
         self.assertEqual(ingredients[0].unit, "kg")
 
-    @patch('requests.get')
-    @patch('requests.delete')
+    @patch('requests.Session.get')
+    @patch('requests.Session.delete')
     def test_clear_shoppinglist(self, mock_delete, mock_get):
         mock_response_get = MagicMock()
         mock_response_get.status_code = 200
@@ -104,7 +107,86 @@ class TestMealieInstance(unittest.TestCase):
         mock_get.assert_called_once()
         mock_delete.assert_called_once()
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
+    def test_get_shopping_list_state(self, mock_get):
+        mock_get.return_value = MagicMock(status_code=200, text=json.dumps({"total": 3, "items": [{"id": "a", "updatedAt": "2025-04-01T10:00:00"}]}))
+
+        self.assertEqual(self.mealie_instance.get_shopping_list_state(), "3:2025-04-01T10:00:00")
+        self.assertEqual(mock_get.call_args.kwargs["params"]["perPage"], 1)
+
+    @patch('requests.Session.get')
+    def test_get_shopping_list_ingredients_by_id(self, mock_get):
+        items = {
+            "a": {"id": "a", "checked": False, "quantity": 2, "food": {"name": "Flour"}, "unit": None, "note": ""},
+            "b": {"id": "b", "checked": True, "quantity": 1, "food": {"name": "Sugar"}, "unit": None, "note": ""},
+        }
+        mock_get.side_effect = lambda url, **kwargs: MagicMock(
+            status_code=200 if url.split("/")[-1] in items else 404, text=json.dumps(items.get(url.split("/")[-1])))
+
+        ingredients = self.mealie_instance.get_shopping_list_ingredients_by_id({"a", "b", "c"})
+
+        self.assertEqual([ingredient.name for ingredient in ingredients], ["Flour"])
+        self.assertEqual(mock_get.call_count, 3)
+
+    @patch('requests.Session.get')
+    def test_clear_shoppinglist_failed_get(self, mock_get):
+        mock_get.return_value = MagicMock(status_code=500, text="error")
+
+        self.assertFalse(self.mealie_instance.clear_shoppinglist())
+
+    @patch('requests.Session.get')
+    @patch('requests.Session.delete')
+    def test_clear_shoppinglist_deletes_all_pages(self, mock_delete, mock_get):
+        items = [{"id": str(i), "checked": False} for i in range(MEALIE_PAGE_SIZE * 2 + 200)]
+        total = len(items)
+        lock = threading.Lock()
+
+        def get_page(url, params=None, **kwargs):
+            start = (params["page"] - 1) * params["perPage"]
+            page = items[start:start + params["perPage"]]
+            return MagicMock(status_code=200, text=json.dumps({"items": page}))
+
+        def delete(url, params=None, **kwargs):
+            # Like mealie, later items move to earlier pages. Batches are deleted concurrently
+            with lock:
+                items[:] = [item for item in items if item["id"] not in params["ids"]]
+            return MagicMock(status_code=200)
+
+        mock_get.side_effect = get_page
+        mock_delete.side_effect = delete
+
+        self.assertTrue(self.mealie_instance.clear_shoppinglist())
+        self.assertEqual(items, [])
+        self.assertEqual(mock_delete.call_count, -(-total // MEALIE_BULK_BATCH_SIZE))
+
+    @patch('requests.Session.get')
+    @patch('requests.Session.delete')
+    def test_update_shopping_list_items_deletes_in_batches(self, mock_delete, mock_get):
+        items = [{"id": str(i), "checked": False} for i in range(7)]
+        mock_get.return_value = MagicMock(status_code=200, text=json.dumps({"items": items}))
+        mock_delete.side_effect = lambda url, **kwargs: MagicMock(status_code=500 if "6" in kwargs["params"]["ids"] else 200, text="error")
+
+        summary = self.mealie_instance.update_shopping_list_items({"0", "1", "2", "3", "6"}, "delete", batch_size=2)
+
+        self.assertEqual(mock_delete.call_count, 3)
+        self.assertTrue(all(len(call.kwargs["params"]["ids"]) <= 2 for call in mock_delete.call_args_list))
+        self.assertEqual(sorted(summary.succeeded), ["0", "1", "2", "3"])
+        self.assertEqual(list(summary.failed), ["6"])
+
+    @patch('requests.Session.get')
+    @patch('requests.Session.put')
+    def test_update_shopping_list_items_checks_items(self, mock_put, mock_get):
+        items = [{"id": "a", "checked": False, "note": "Salt"}, {"id": "b", "checked": True}, {"id": "c", "checked": False}]
+        mock_get.return_value = MagicMock(status_code=200, text=json.dumps({"items": items}))
+        mock_put.return_value = MagicMock(status_code=200)
+
+        summary = self.mealie_instance.update_shopping_list_items({"a", "b"}, "check")
+
+        mock_put.assert_called_once()
+        self.assertEqual(mock_put.call_args.kwargs["json"], [{"id": "a", "checked": True, "note": "Salt"}])
+        self.assertEqual(summary.succeeded, ["a"])
+
+    @patch('requests.Session.get')
     def test_test_connection_success(self, mock_get):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -113,7 +195,7 @@ class TestMealieInstance(unittest.TestCase):
 
         self.assertTrue(self.mealie_instance.test_connection())
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_test_connection_failure(self, mock_get):
         mock_response = MagicMock()
         mock_response.status_code = 404
@@ -121,6 +203,135 @@ class TestMealieInstance(unittest.TestCase):
 
         self.assertFalse(self.mealie_instance.test_connection())
 
+    def _mock_pages(self, mock_get, total_items, per_page, with_total_pages=True):
+        def get(url, params=None, **kwargs):
+            page = params["page"]
+            items = [{"id": i, "name": f"Food {i}", "pluralName": None, "description": "", "aliases": []}
+                     for i in range((page - 1) * per_page, min(page * per_page, total_items))]
+            body = {"page": page, "items": items}
+            if with_total_pages:
+                body["total_pages"] = -(-total_items // per_page)
+
+            response = MagicMock()
+            response.status_code = 200
+            response.text = json.dumps(body)
+            return response
+
+        mock_get.side_effect = get
+
+    @patch('requests.Session.get')
+    def test_paginate_with_prefetch(self, mock_get):
+        self._mock_pages(mock_get, total_items=25, per_page=10)
+
+        foods = list(self.mealie_instance.paginate("/foods", lambda item: item["id"], "foods", per_page=10, prefetch=2))
+
+        self.assertEqual(foods, list(range(25)))
+        self.assertEqual(mock_get.call_count, 3)
+
+    @patch('requests.Session.get')
+    def test_paginate_without_total_pages(self, mock_get):
+        self._mock_pages(mock_get, total_items=20, per_page=10, with_total_pages=False)
+
+        foods = list(self.mealie_instance.paginate("/foods", lambda item: item["id"], "foods", per_page=10, prefetch=0))
+
+        self.assertEqual(foods, list(range(20)))
+        self.assertEqual(mock_get.call_count, 3)
+
+    @patch('requests.Session.get')
+    def test_paginate_is_lazy(self, mock_get):
+        self._mock_pages(mock_get, total_items=100, per_page=10)
+
+        foods = self.mealie_instance.paginate("/foods", lambda item: item["id"], "foods", per_page=10, prefetch=0)
+        self.assertEqual(next(foods), 0)
+        self.assertEqual(mock_get.call_count, 1)
+        foods.close()
+
+    @patch('requests.Session.get')
+    def test_get_all_foods_beyond_first_page(self, mock_get):
+        self._mock_pages(mock_get, total_items=1200, per_page=500)
+
+        foods = self.mealie_instance.get_all_foods()
+
+        self.assertEqual(len(foods), 1200)
+        self.assertEqual(foods[-1].name, "Food 1199")
+
+    @patch('requests.Session.get')
+    def test_paginate_failure(self, mock_get):
+        mock_get.return_value.status_code = 500
+        mock_get.return_value.text = "error"
+
+        with self.assertRaises(Exception):
+            list(self.mealie_instance.paginate("/foods", lambda item: item, "foods"))
+
+    def _mock_week_plan(self, mock_get, plan_items):
+        def get(url, **kwargs):
+            response = MagicMock()
+            response.status_code = 200
+            if "/mealplans" in url:
+                response.text = json.dumps({"items": plan_items})
+            else:
+                recipe_id = url.rsplit("/", 1)[1]
+                response.text = json.dumps({"id": recipe_id, "name": f"Recipe {recipe_id}", "recipeIngredient": []})
+            return response
+
+        mock_get.side_effect = get
+
+    @patch('requests.Session.get')
+    def test_get_week_plan_loads_distinct_recipes_once(self, mock_get):
+        plan_items = [{"recipe": {"id": str(i % 3), "dateUpdated": "2025-01-01"}} for i in range(21)]
+        plan_items.append({"recipe": None, "title": "Leftovers"})
+        self._mock_week_plan(mock_get, plan_items)
+
+        week_plan = self.mealie_instance.get_week_plan()
+
+        self.assertEqual(len(week_plan), 21)
+        self.assertEqual([recipe.name for recipe in week_plan[:4]], ["Recipe 0", "Recipe 1", "Recipe 2", "Recipe 0"])
+        # Meal plan and three recipes
+        self.assertEqual(mock_get.call_count, 4)
+
+    @patch('requests.Session.get')
+    def test_get_week_plan_uses_recipe_cache(self, mock_get):
+        self._mock_week_plan(mock_get, [{"recipe": {"id": "1", "dateUpdated": "2025-01-01"}}])
+        self.mealie_instance.get_week_plan()
+        self.mealie_instance.get_week_plan()
+        self.assertEqual(mock_get.call_count, 3)
+
+        # Updated recipes are loaded again
+        self._mock_week_plan(mock_get, [{"recipe": {"id": "1", "dateUpdated": "2025-02-01"}}])
+        self.mealie_instance.get_week_plan()
+        self.assertEqual(mock_get.call_count, 5)
+
+    @patch('services.mealie_service.sleep')
+    @patch('requests.Session.post')
+    def test_create_food_items_bulk(self, mock_post, mock_sleep):
+        existing_foods = [MealieFoodItem(1, "Olivenöl", None, None, [{"name": "Olive Oil"}])]
+        products = [
+            GrocyProductItem(1, "Olive Oil"),
+            GrocyProductItem(2, "Milk", "Fresh milk"),
+            GrocyProductItem(3, "milk "),
+            GrocyProductItem(4, "Flaky"),
+            GrocyProductItem(5, "Broken"),
+        ]
+        attempts = {}
+
+        def post(url, json=None, **kwargs):
+            attempts[json["name"]] = attempts.get(json["name"], 0) + 1
+            response = MagicMock()
+            response.status_code = 201
+            if json["name"] == "Broken" or (json["name"] == "Flaky" and attempts["Flaky"] == 1):
+                response.status_code = 500
+            return response
+
+        mock_post.side_effect = post
+
+        summary = self.mealie_instance.create_food_items_from_grocy_products_if_not_present(products, existing_foods, workers=2, retries=3)
+
+        self.assertEqual(sorted(summary.created), ["Flaky", "Milk"])
+        self.assertEqual(summary.skipped, ["Olive Oil", "milk "])
+        self.assertEqual(list(summary.failed), ["Broken"])
+        self.assertEqual(attempts, {"Milk": 1, "Flaky": 2, "Broken": 3})
+        self.assertEqual(summary.to_dict()["created"], summary.created)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,68 @@
+import threading
+import time
+import unittest
+
+from services.parallel_writer import ParallelWriter
+
+
+class TestParallelWriter(unittest.TestCase):
+
+    def test_writes_with_same_key_keep_order(self):
+        writes = []
+
+        def write(value):
+            time.sleep(.01)
+            writes.append(value)
+
+        writer = ParallelWriter(4)
+        for value in range(5):
+            writer.submit("notes", str(value), write, value)
+
+        results = writer.run()
+
+        self.assertEqual(writes, [0, 1, 2, 3, 4])
+        self.assertTrue(all(result.success for result in results))
+
+    def test_writes_with_different_keys_run_concurrently(self):
+        barrier = threading.Barrier(3, timeout=1)
+
+        writer = ParallelWriter(3)
+        for key in range(3):
+            writer.submit(key, str(key), barrier.wait)
+
+        self.assertTrue(all(result.success for result in writer.run()))
+
+    def test_failures_are_collected(self):
+        def fail():
+            raise Exception("Failed to add item to shopping list")
+
+        writes = []
+        writer = ParallelWriter(2)
+        writer.submit(1, "Flour", fail)
+        writer.submit(1, "Flour again", writes.append, 1)
+        writer.submit(2, "Milk", writes.append, 2)
+
+        results = writer.run()
+
+        self.assertEqual(sorted(writes), [1, 2])
+        self.assertEqual([str(result) for result in results if not result.success], ["Flour: Failed to add item to shopping list"])
+
+    def test_results_are_reported_as_they_finish(self):
+        reported = []
+        writer = ParallelWriter(2)
+        writer.submit(1, "Flour", lambda: None)
+        writer.submit(2, "Milk", lambda: None)
+
+        writer.run(reported.append)
+
+        self.assertEqual(sorted(result.description for result in reported), ["Flour", "Milk"])
+
+    def test_run_clears_queue(self):
+        writer = ParallelWriter(2)
+        writer.submit(1, "Flour", lambda: None)
+        writer.run()
+        self.assertEqual(writer.run(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
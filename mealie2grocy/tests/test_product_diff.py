@@ -0,0 +1,54 @@
+import unittest
+
+from models.grocy import GrocyProductItem
+from models.mealie import MealieFoodItem
+from services.product_diff import ProductDiff
+
+
+class TestProductDiff(unittest.TestCase):
+
+    def setUp(self):
+        self.products = [
+            GrocyProductItem(1, "Tomate"),
+            GrocyProductItem(2, "Olive Oil"),
+            GrocyProductItem(3, "Mehl"),
+            GrocyProductItem(4, "mehl"),
+        ]
+        self.foods = [
+            MealieFoodItem("a", "Tomate"),
+            MealieFoodItem("b", "Olivenöl", None, None, ["Olive Oil"]),
+            MealieFoodItem("c", "Tomatoes"),
+        ]
+        self.diff = ProductDiff(self.products, self.foods)
+
+    def test_missing(self):
+        self.assertEqual([product["id"] for product in self.diff.missing_in_mealie], [3, 4])
+        self.assertEqual(self.diff.missing_in_grocy, [{"id": "c", "name": "Tomatoes", "suggestions": []}])
+
+    def test_alias_matches(self):
+        self.assertEqual(self.diff.alias_matches, [{"food": "Olivenöl", "product": "Olive Oil", "via": "Olive Oil"}])
+
+    def test_name_conflicts(self):
+        self.assertEqual(self.diff.name_conflicts, [{"source": "grocy", "name": "Mehl", "names": ["Mehl", "mehl"]}])
+
+    def test_to_dict_paginates_every_section(self):
+        page = self.diff.to_dict(page=2, per_page=1)
+        self.assertEqual(page["missing_in_mealie"], [{"id": 4, "name": "mehl"}])
+        self.assertEqual(page["missing_in_grocy"], [])
+        self.assertEqual(page["total"]["missing_in_mealie"], 2)
+
+    def test_for_catalog_reuses_unchanged_diff(self):
+        diff = ProductDiff.for_catalog(self.products, self.foods)
+        self.assertIs(ProductDiff.for_catalog(list(self.products), list(self.foods)), diff)
+
+        changed = ProductDiff.for_catalog(self.products + [GrocyProductItem(5, "Zucker")], self.foods)
+        self.assertIsNot(changed, diff)
+        self.assertNotEqual(changed.version, diff.version)
+
+    def test_identical_catalogs(self):
+        diff = ProductDiff([GrocyProductItem(1, "Tomate")], [MealieFoodItem("a", "tomate")])
+        self.assertTrue(diff.is_empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
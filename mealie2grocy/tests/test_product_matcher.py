@@ -0,0 +1,57 @@
+import unittest
+
+from models.grocy import GrocyProductItem
+from models.mealie import MealieFoodItem
+from services.product_matcher import ProductMatcher, normalize
+
+
+class TestProductMatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.products = [
+            GrocyProductItem(1, "Tomate"),
+            GrocyProductItem(2, "Olive Oil"),
+            GrocyProductItem(3, "Ei"),
+        ]
+        self.foods = [
+            MealieFoodItem("a", "Ei", "Eier", None, [{"name": "Hühnerei"}]),
+            MealieFoodItem("b", "Olivenöl", None, None, ["Olive Oil"]),
+            MealieFoodItem("c", "Zucker"),
+        ]
+        self.matcher = ProductMatcher(self.products, self.foods)
+
+    def test_normalize(self):
+        self.assertEqual(normalize("  Olive   OIL "), "olive oil")
+
+    def test_match_ignores_case_and_whitespace(self):
+        self.assertEqual(self.matcher.match("olive  oil").id, 2)
+
+    def test_match_plural_name_and_aliases(self):
+        self.assertEqual(self.matcher.match_with_kind("Eier"), (self.products[2], "alias"))
+        self.assertEqual(self.matcher.match("Hühnerei").id, 3)
+        self.assertEqual(self.matcher.match("Olivenöl").id, 2)
+
+    def test_match_plural_suffix(self):
+        self.assertEqual(self.matcher.match_with_kind("Tomaten"), (self.products[0], "plural"))
+
+    def test_no_match(self):
+        self.assertIsNone(self.matcher.match("Zucker"))
+        self.assertIsNone(self.matcher.match(""))
+
+    def test_match_food_and_has_food(self):
+        self.assertEqual(self.matcher.match_food(self.foods[1]).id, 2)
+        self.assertIsNone(self.matcher.match_food(self.foods[2]))
+        self.assertTrue(self.matcher.has_food(self.products[1]))
+        self.assertFalse(self.matcher.has_food(self.products[0]))
+
+    def test_for_catalog_reuses_matcher(self):
+        first = ProductMatcher.for_catalog(self.products, self.foods)
+        second = ProductMatcher.for_catalog(list(self.products), list(self.foods))
+        third = ProductMatcher.for_catalog(self.products + [GrocyProductItem(4, "Salz")], self.foods)
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, third)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from models.grocy import GrocyProductItem
+from models.mealie import MealieFoodItem, MealieFoodImportSummary
+from services.grocy_service import GrocyInstance
+from services.mealie_service import MealieInstance
+from services.product_sync import IncrementalProductSync
+from services.state_store import StateStore
+
+
+class TestIncrementalProductSync(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = StateStore(os.path.join(self.directory.name, "test.sqlite"))
+
+        self.mock_grocy = MagicMock(spec=GrocyInstance)
+        self.mock_mealie = MagicMock(spec=MealieInstance)
+        self.mock_grocy.get_db_changed_time.return_value = "t1"
+        self.mock_grocy.get_all_products.return_value = [
+            GrocyProductItem(1, "Milk", "Fresh"),
+            GrocyProductItem(2, "Flour"),
+        ]
+        self.mock_mealie.get_all_foods.return_value = [MealieFoodItem("a", "Milk", None, "Fresh")]
+
+        def create(products, foods):
+            summary = MealieFoodImportSummary()
+            summary.created = [product.name for product in products if product.name != "Milk"]
+            summary.skipped = [product.name for product in products if product.name == "Milk"]
+            return summary
+
+        self.mock_mealie.create_food_items_from_grocy_products_if_not_present.side_effect = create
+
+        self.sync = IncrementalProductSync(self.mock_grocy, self.mock_mealie, self.store)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_first_run_imports_all_products(self):
+        summary = self.sync.run()
+        self.assertEqual(summary.created, ["Flour"])
+        self.assertEqual(set(self.store.get_product_hashes()), {1, 2})
+
+    def test_unchanged_grocy_costs_one_check(self):
+        self.sync.run()
+        self.mock_grocy.get_all_products.reset_mock()
+        self.mock_mealie.get_all_foods.reset_mock()
+
+        summary = self.sync.run()
+
+        self.assertEqual(str(summary), "0 created, 0 updated, 0 skipped, 0 failed")
+        self.mock_grocy.get_all_products.assert_not_called()
+        self.mock_mealie.get_all_foods.assert_not_called()
+
+    def test_unchanged_products_skip_mealie(self):
+        self.sync.run()
+        self.mock_grocy.get_db_changed_time.return_value = "t2"
+        self.mock_mealie.get_all_foods.reset_mock()
+
+        self.sync.run()
+
+        self.mock_mealie.get_all_foods.assert_not_called()
+
+    def test_changed_description_is_updated(self):
+        self.sync.run()
+        self.mock_grocy.get_db_changed_time.return_value = "t2"
+        self.mock_grocy.get_all_products.return_value = [
+            GrocyProductItem(1, "Milk", "Whole milk"),
+            GrocyProductItem(2, "Flour"),
+        ]
+        self.mock_mealie.create_food_items_from_grocy_products_if_not_present.reset_mock()
+
+        summary = self.sync.run()
+
+        self.assertEqual(summary.updated, ["Milk"])
+        food, description = self.mock_mealie.update_food_description.call_args.args
+        self.assertEqual((food.mid, description), ("a", "Whole milk"))
+        self.mock_mealie.create_food_items_from_grocy_products_if_not_present.assert_not_called()
+
+    def test_failed_products_are_retried(self):
+        def create(products, foods):
+            summary = MealieFoodImportSummary()
+            summary.failed = {product.name: "error" for product in products}
+            return summary
+
+        self.mock_mealie.create_food_items_from_grocy_products_if_not_present.side_effect = create
+
+        self.sync.run()
+
+        self.assertEqual(set(self.store.get_product_hashes()), set())
+        self.assertIsNone(self.store.get_meta("products_grocy_changed_time"))
+
+
+if __name__ == '__main__':
+    unittest.main()
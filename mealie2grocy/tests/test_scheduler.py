@@ -0,0 +1,76 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from services.scheduler import PeriodicScheduler
+from services.state_store import StateStore
+
+
+class TestPeriodicScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = StateStore(os.path.join(self.directory.name, "test.sqlite"))
+        self.task = MagicMock()
+        self.scheduler = PeriodicScheduler("sync", 60, self.task, self.store, jitter=.1, max_backoff=8)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_only_one_scheduler_runs_the_task(self):
+        other = PeriodicScheduler("sync", 60, self.task, StateStore(self.store.path))
+
+        self.assertTrue(self.scheduler.run_once())
+        self.assertFalse(other.run_once())
+        self.assertEqual(self.task.call_count, 1)
+
+        self.assertTrue(self.scheduler.run_once())
+        self.assertEqual(self.task.call_count, 2)
+
+    def test_backoff_after_failures(self):
+        self.task.side_effect = Exception("Failed to get shopping list from grocy")
+
+        for _ in range(5):
+            self.scheduler.run_once()
+
+        self.assertEqual(self.scheduler.failures, 5)
+        self.assertTrue(60 * 8 * .9 <= self.scheduler.next_delay() <= 60 * 8 * 1.1)
+
+        self.task.side_effect = None
+        self.scheduler.run_once()
+        self.assertTrue(60 * .9 <= self.scheduler.next_delay() <= 60 * 1.1)
+
+    def test_lease_moves_on_after_owner_is_gone(self):
+        scheduler = PeriodicScheduler("sync", 60, self.task, self.store, lease_ttl=.05)
+        other = PeriodicScheduler("sync", 60, self.task, StateStore(self.store.path), lease_ttl=.05)
+
+        self.assertTrue(scheduler.run_once())
+        self.assertFalse(other.run_once())
+
+        time.sleep(.1)
+        self.assertTrue(other.run_once())
+
+    def test_heartbeat_keeps_lease(self):
+        scheduler = PeriodicScheduler("sync", 60, self.task, self.store, lease_ttl=.1)
+        other = PeriodicScheduler("sync", 60, self.task, StateStore(self.store.path), lease_ttl=.1)
+
+        self.assertTrue(scheduler.run_once())
+        scheduler.start()
+        try:
+            time.sleep(.3)
+            self.assertFalse(other.run_once())
+        finally:
+            scheduler.stop()
+
+        self.assertTrue(other.run_once())
+
+    def test_stop_releases_lease(self):
+        self.scheduler.run_once()
+        self.scheduler.stop()
+        self.assertIsNone(self.store.get_lease_owner("sync"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,12 @@
+import os
+import tempfile
+import time
 import unittest
 from unittest.mock import patch
 
 from server import app
+from services.job_runner import JobRunner
+from services.state_store import StateStore
 
 
 class FlaskAppTestCase(unittest.TestCase):
@@ -21,15 +26,56 @@ class FlaskAppTestCase(unittest.TestCase):
         self.assertIn(b'{"success":true}', response.data)
 
     @patch('server.check_auth')
+    @patch('server.get_job_runner')
     @patch('server.update_grocy_shoppinglist_from_mealie')
-    def test_update_grocy_shoppinglist(self, mock_update_shoppinglist, mock_check_auth):
+    def test_update_grocy_shoppinglist(self, mock_update_shoppinglist, mock_get_job_runner, mock_check_auth):
         mock_check_auth.return_value = True
         mock_update_shoppinglist.return_value = 'Sample Result'
-        response = self.app.get('/update-grocy-shoppinglist')
-        self.assertEqual(response.status_code, 200)
-        self.assertTrue(mock_update_shoppinglist.called)
-        self.assertIn(b'"success":true', response.data)
-        self.assertIn(b'Sample Result', response.data)
+
+        with tempfile.TemporaryDirectory() as directory:
+            mock_get_job_runner.return_value = JobRunner(StateStore(os.path.join(directory, "test.sqlite")), lease_ttl=5)
+
+            response = self.app.get('/update-grocy-shoppinglist')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'"success":true', response.data)
+            job_id = response.get_json()["job_id"]
+
+            for _ in range(200):
+                job = self.app.get(f'/jobs/{job_id}').get_json()
+                if job["status"] == "done" and mock_get_job_runner.return_value.store.get_lease_owner("shoppinglist") is None:
+                    break
+                time.sleep(.01)
+
+            self.assertTrue(mock_update_shoppinglist.called)
+            self.assertEqual(job["result"], 'Sample Result')
+
+    @patch('server.check_auth')
+    @patch('server.get_job_runner')
+    def test_job_events(self, mock_get_job_runner, mock_check_auth):
+        mock_check_auth.return_value = True
+        runner = mock_get_job_runner.return_value
+        runner.follow.return_value = iter([
+            {"id": 1, "event": "phase", "data": "fetching"},
+            None,
+            {"id": 2, "event": "done", "data": "Flour is added to the shopping list.\n"},
+        ])
+
+        response = self.app.get('/jobs/1/events', headers={"Last-Event-ID": "0"})
+
+        self.assertEqual(response.mimetype, "text/event-stream")
+        self.assertEqual(response.get_data(as_text=True),
+                         'id: 1\nevent: phase\ndata: "fetching"\n\n'
+                         ': keepalive\n\n'
+                         'id: 2\nevent: done\ndata: "Flour is added to the shopping list.\\n"\n\n')
+        runner.follow.assert_called_once_with("1", 0)
+
+    @patch('server.check_auth')
+    @patch('server.get_job_runner')
+    def test_unknown_job(self, mock_get_job_runner, mock_check_auth):
+        mock_check_auth.return_value = True
+        mock_get_job_runner.return_value.get.return_value = None
+        response = self.app.get('/jobs/unknown')
+        self.assertEqual(response.status_code, 404)
 
     @patch('server.check_auth')
     @patch('server.compare_product_databases')
@@ -42,6 +88,56 @@ class FlaskAppTestCase(unittest.TestCase):
         self.assertIn(b'"success":true', response.data)
         self.assertIn(b'Comparison Result', response.data)
 
+    @patch('server.check_auth')
+    @patch('server.get_product_diff')
+    def test_compare_product_databases_json(self, mock_get_diff, mock_check_auth):
+        mock_check_auth.return_value = True
+        mock_get_diff.return_value.to_dict.return_value = {"missing_in_mealie": []}
+        response = self.app.get('/compare-product-databases?format=json&page=2&per_page=50')
+        self.assertEqual(response.status_code, 200)
+        mock_get_diff.return_value.to_dict.assert_called_once_with(2, 50)
+        self.assertIn(b'"missing_in_mealie":[]', response.data)
+
+    @patch('server.check_auth')
+    @patch('server.get_product_diff')
+    def test_compare_product_databases_json_invalid_page(self, mock_get_diff, mock_check_auth):
+        mock_check_auth.return_value = True
+        for query in ("page=0", "page=-1", "per_page=0", "page=1&per_page=-5"):
+            response = self.app.get(f'/compare-product-databases?format=json&{query}')
+            self.assertEqual(response.status_code, 400, query)
+        self.assertFalse(mock_get_diff.called)
+
+    @patch('server.check_auth')
+    @patch('server.plan_grocy_shoppinglist_from_mealie')
+    def test_plan_grocy_shoppinglist(self, mock_plan, mock_check_auth):
+        mock_check_auth.return_value = True
+        mock_plan.return_value = {"result": "", "notes": [], "plan": {"operations": []}}
+        response = self.app.get('/plan-grocy-shoppinglist')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'"plan":{"operations":[]}', response.data)
+
+    @patch('server.API_KEYS', ["secret"])
+    @patch('server.get_webhook_debouncer')
+    def test_webhook(self, mock_get_debouncer):
+        payload = {"document_data": {"shopping_list_item_ids": ["a"]}}
+
+        response = self.app.post('/webhook', json=payload, headers={"Authorization": "Bearer secret"})
+        self.assertEqual(response.status_code, 202)
+        mock_get_debouncer.return_value.add.assert_called_once_with({"a"})
+
+        response = self.app.post('/webhook', json={"event": "stock_changed"}, headers={"Authorization": "Bearer secret"})
+        self.assertEqual(response.status_code, 202)
+        mock_get_debouncer.return_value.add.assert_called_with({"*"})
+
+    @patch('server.API_KEYS', ["secret"])
+    @patch('server.get_webhook_debouncer')
+    def test_webhook_unauthorized(self, mock_get_debouncer):
+        self.assertEqual(self.app.post('/webhook', json={}).status_code, 403)
+        self.assertEqual(self.app.post('/webhook?token=', json={}).status_code, 403)
+        self.assertEqual(self.app.post('/webhook?token=secret', json={}).status_code, 403)
+        self.assertEqual(self.app.post('/webhook', json={}, headers={"Authorization": "Bearer wrong"}).status_code, 403)
+        self.assertFalse(mock_get_debouncer.return_value.add.called)
+
     @patch('server.test_grocy_connection')
     @patch('server.test_mealie_connection')
     def test_health_check(self, mock_mealie_connection, mock_grocy_connection):
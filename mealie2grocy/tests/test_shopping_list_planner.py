@@ -0,0 +1,40 @@
+import unittest
+
+from models.grocy import GrocyShoppingListItem
+from models.ingredient import Ingredient
+from services.shopping_list_planner import plan_shopping_list, INSERT, UPDATE, NOOP
+
+
+class TestShoppingListPlanner(unittest.TestCase):
+
+    def setUp(self):
+        self.flour = Ingredient("Flour", 1, "kg", gid=1)
+        self.milk = Ingredient("Milk", 1, "l", gid=2)
+        self.eggs = Ingredient("Eggs", 6, "Piece", gid=3)
+        self.items = [
+            GrocyShoppingListItem(10, 2, 1, 11, "Organic"),
+            GrocyShoppingListItem(11, 2, 0.5, 11),
+            GrocyShoppingListItem(12, 3, 6, 12),
+        ]
+
+    def test_plan(self):
+        plan = plan_shopping_list([(self.flour, 2), (self.milk, 1.5), (self.eggs, 0)], self.items)
+
+        actions = [(operation.action, operation.amount, operation.item_id) for operation in plan.operations]
+        self.assertEqual(actions, [(INSERT, 2, None), (UPDATE, 2.5, 10), (NOOP, 6, 12)])
+        self.assertEqual(len(plan.writes), 2)
+
+    def test_rounding_noise_is_not_written(self):
+        plan = plan_shopping_list([(self.milk, 0.05)], self.items)
+        self.assertEqual(plan.writes, [])
+
+    def test_to_dict(self):
+        plan = plan_shopping_list([(self.flour, 2), (self.eggs, 0)], self.items)
+
+        result = plan.to_dict()
+        self.assertEqual((result[INSERT], result[UPDATE], result[NOOP]), (1, 0, 1))
+        self.assertEqual(result["operations"][0], {"action": INSERT, "product_id": 1, "name": "Flour", "amount": 2, "previous_amount": 0, "item_id": None})
+
+
+if __name__ == '__main__':
+    unittest.main()
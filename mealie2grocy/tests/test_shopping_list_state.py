@@ -0,0 +1,70 @@
+import unittest
+
+from models.ingredient import Ingredient
+from services.shopping_list_state import ShoppingListChanges
+
+
+def entry(product_id, name, amount, unit, converted_amount=None, converted_unit=None):
+    return {"product_id": product_id, "name": name, "amount": amount, "unit": unit, "converted_amount": converted_amount, "converted_unit": converted_unit}
+
+
+class TestShoppingListChanges(unittest.TestCase):
+
+    def setUp(self):
+        self.synced = {
+            "a": entry(1, "Flour", 500, "g", .5, "kg"),
+            "b": entry(2, "Sugar", 1, None, 1, "pack"),
+            "c": entry(3, "Milk", 1, "l", 1, "l"),
+        }
+
+    def test_classifies_items(self):
+        flour = Ingredient("Flour", 500, "g", mid="a", gid=1)
+        sugar = Ingredient("Sugar", 2, None, mid="b", gid=2)
+        eggs = Ingredient("Eggs", 6, None, mid="d", gid=4)
+
+        changes = ShoppingListChanges([flour, sugar, eggs], self.synced)
+
+        self.assertEqual(changes.unchanged, [flour])
+        self.assertEqual(changes.changed, [sugar])
+        self.assertEqual(changes.added, [eggs])
+        self.assertEqual(changes.removed, ["c"])
+        self.assertEqual(changes.pending_products, {2, 4})
+        self.assertEqual(changes.other_ingredients({3}), [])
+
+    def test_changed_product_is_pending(self):
+        flour = Ingredient("Flour", 500, "g", mid="a", gid=5)
+
+        changes = ShoppingListChanges([flour], self.synced)
+
+        self.assertEqual(changes.changed, [flour])
+
+    def test_partial_sync_keeps_other_items(self):
+        milk = Ingredient("Milk", 2, "l", mid="d", gid=3)
+
+        changes = ShoppingListChanges([milk], self.synced, item_ids={"d"})
+
+        self.assertEqual(changes.removed, [])
+        other = changes.other_ingredients({3})
+        self.assertEqual([(ingredient.mid, ingredient.amount, ingredient.unit) for ingredient in other], [("c", 1, "l")])
+
+    def test_partial_sync_removes_requested_items_that_are_gone(self):
+        # "a" was checked or deleted in mealie before the webhook sync loaded it
+        changes = ShoppingListChanges([], self.synced, item_ids={"a"})
+
+        self.assertEqual(changes.removed, ["a"])
+        self.assertEqual(changes.other_ingredients({1}), [])
+        self.assertEqual(len(changes.other_ingredients({2, 3})), 2)
+
+    def test_record_only_pending_items(self):
+        flour = Ingredient("Flour", 500, "g", mid="a", gid=1)
+        eggs = Ingredient("Eggs", 6, None, mid="d", gid=4)
+        changes = ShoppingListChanges([flour, eggs], self.synced)
+
+        changes.record(flour, Ingredient("Flour", .5, "kg"))
+        changes.record(eggs, Ingredient("Eggs", 6, "piece"))
+
+        self.assertEqual(changes.entries, {"d": entry(4, "Eggs", 6, None, 6, "piece")})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+
+from services.state_store import StateStore
+
+
+class TestStateStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = StateStore(os.path.join(self.directory.name, "state", "test.sqlite"))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_meta(self):
+        self.assertIsNone(self.store.get_meta("key"))
+        self.store.set_meta("key", "value")
+        self.assertEqual(self.store.get_meta("key"), "value")
+
+    def test_product_hashes(self):
+        self.store.update_product_hashes({1: "a", 2: "b"})
+        self.store.update_product_hashes({2: "c"}, removed_product_ids={1})
+        self.assertEqual(self.store.get_product_hashes(), {2: "c"})
+
+    def test_shopping_list_items(self):
+        flour = {"product_id": 1, "name": "Flour", "amount": 500, "unit": "g", "converted_amount": .5, "converted_unit": "kg"}
+        note = {"product_id": None, "name": "Candles", "amount": 2, "unit": None, "converted_amount": None, "converted_unit": None}
+
+        self.store.update_shopping_list_items({"a": flour, "b": note})
+        self.store.update_shopping_list_items({"a": {**flour, "amount": 750}}, removed_ids={"b"})
+
+        self.assertEqual(self.store.get_shopping_list_items(), {"a": {**flour, "amount": 750, "written": False}})
+
+    def test_state_is_shared_between_instances(self):
+        self.store.set_meta("key", "value")
+        other = StateStore(self.store.path)
+        self.assertEqual(other.get_meta("key"), "value")
+
+    def test_lease(self):
+        self.assertTrue(self.store.acquire_lease("sync", "a", ttl=60))
+        self.assertFalse(self.store.acquire_lease("sync", "b", ttl=60))
+        self.assertEqual(self.store.get_lease_owner("sync"), "a")
+
+        self.store.release_lease("sync", "b")
+        self.assertEqual(self.store.get_lease_owner("sync"), "a")
+
+        self.store.release_lease("sync", "a")
+        self.assertTrue(self.store.acquire_lease("sync", "b", ttl=60))
+
+    def test_job(self):
+        self.store.create_job("1", "sync", "queued")
+        self.store.update_job("1", status="done", result={"added": ["Flour"]})
+
+        job = self.store.get_job("1")
+        self.assertEqual((job["status"], job["result"]), ("done", {"added": ["Flour"]}))
+        self.assertIsNone(self.store.get_job("2"))
+
+
+if __name__ == '__main__':
+    unittest.main()
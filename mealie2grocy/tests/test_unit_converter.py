@@ -92,5 +92,71 @@ class TestUnitConverter(unittest.TestCase):
             converted_ingredient = self.unit_converter.convert(ingredient, stock_item)
             self.assertIn('Could not convert', log.output[0])
 
+    def test_prefetched_product_conversions(self):
+        self.mock_grocy.get_unit_conversions_resolved.return_value = {
+            5: {('Gram', 'Pack'): 0.002}
+        }
+        ingredient = Ingredient("Rice", 500, "Gram", None)
+        stock_item = GrocyStockItem(5, "Rice", 0, 0, 0, 7, 'Pack')
+
+        self.unit_converter.prefetch_product_conversions({5})
+        first = self.unit_converter.convert(ingredient, stock_item)
+        second = self.unit_converter.convert(ingredient, stock_item)
+
+        self.assertEqual(first.amount, 1)
+        self.assertEqual(second.unit, 'Pack')
+        self.mock_grocy.get_unit_conversions_resolved.assert_called_once_with({5})
+        self.mock_grocy.get_unit_conversion_resolved.assert_not_called()
+
+    def test_product_conversions_are_memoized_without_prefetch(self):
+        self.mock_grocy.get_unit_conversion_resolved.return_value = {('Gram', 'Pack'): 0.002}
+        ingredient = Ingredient("Rice", 500, "Gram", None)
+        stock_item = GrocyStockItem(5, "Rice", 0, 0, 0, 7, 'Pack')
+
+        self.unit_converter.convert(ingredient, stock_item)
+        self.unit_converter.convert(ingredient, stock_item)
+
+        self.mock_grocy.get_unit_conversion_resolved.assert_called_once_with(5)
+
+    def test_convert_via_abbreviation_and_transitive_conversion(self):
+        grams = MagicMock(abbreviation='g')
+        grams.name = 'Gramm'
+        grocy_g = MagicMock()
+        grocy_g.name = 'g'
+        grocy_pack = MagicMock()
+        grocy_pack.name = 'Pack'
+
+        self.mock_grocy.get_units.return_value = {1: grocy_g, 2: grocy_pack}
+        self.mock_mealie.get_units.return_value = [grams]
+        self.mock_grocy.get_unit_conversions.return_value = {('g', 'kg'): 0.001, ('kg', 'Pack'): 2}
+        converter = UnitConverter(self.mock_grocy, self.mock_mealie)
+
+        ingredient = Ingredient("Coffee", 250, "Gramm", None)
+        stock_item = GrocyStockItem(6, "Coffee", 0, 0, 0, 2, 'Pack')
+
+        converted_ingredient = converter.convert(ingredient, stock_item)
+        self.assertEqual(converted_ingredient.amount, 0.5)
+        self.assertEqual(converted_ingredient.unit, 'Pack')
+
+    def test_product_conversion_takes_precedence_over_transitive_conversion(self):
+        units = []
+        for name in ('EL', 'ml', 'g'):
+            unit = MagicMock(abbreviation=None)
+            unit.name = name
+            units.append(unit)
+
+        self.mock_grocy.get_units.return_value = dict(enumerate(units))
+        self.mock_mealie.get_units.return_value = units
+        self.mock_grocy.get_unit_conversions.return_value = {('EL', 'ml'): 15, ('ml', 'g'): 1}
+        self.mock_grocy.get_unit_conversion_resolved.return_value = {('EL', 'g'): 12}
+        converter = UnitConverter(self.mock_grocy, self.mock_mealie)
+
+        ingredient = Ingredient("Sugar", 2, "EL", None)
+        stock_item = GrocyStockItem(7, "Sugar", 0, 0, 0, 3, 'g')
+
+        self.assertEqual(converter.convert(ingredient, stock_item).amount, 24)
+        self.mock_grocy.get_unit_conversion_resolved.assert_called_once_with(7)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,45 @@
+import unittest
+
+from services.unit_graph import UnitGraph
+
+
+class TestUnitGraph(unittest.TestCase):
+
+    def test_direct_conversion(self):
+        graph = UnitGraph({('g', 'kg'): 0.001})
+        self.assertEqual(graph.factor('g', 'kg'), 0.001)
+
+    def test_inverse_conversion_is_derived(self):
+        graph = UnitGraph({('g', 'kg'): 0.001})
+        self.assertAlmostEqual(graph.factor('kg', 'g'), 1000)
+
+    def test_explicit_inverse_takes_precedence(self):
+        graph = UnitGraph({('Pack', 'Piece'): 6, ('Piece', 'Pack'): 0.2})
+        self.assertEqual(graph.factor('Piece', 'Pack'), 0.2)
+
+    def test_transitive_conversion(self):
+        graph = UnitGraph({('g', 'kg'): 0.001, ('kg', 'Pack'): 2})
+        self.assertAlmostEqual(graph.factor('g', 'Pack'), 0.002)
+        self.assertAlmostEqual(graph.factor('Pack', 'g'), 500)
+
+    def test_unconnected_units(self):
+        graph = UnitGraph({('g', 'kg'): 0.001, ('ml', 'l'): 0.001})
+        self.assertIsNone(graph.factor('g', 'l'))
+        self.assertIsNone(graph.factor('g', 'g'))
+
+    def test_overlay(self):
+        graph = UnitGraph({('Gramm', 'g'): 1, ('g', 'kg'): 0.001})
+        product_graph = graph.with_overlay({('kg', 'Pack'): 4})
+
+        self.assertAlmostEqual(product_graph.factor('Gramm', 'Pack'), 0.004)
+        self.assertIsNone(graph.factor('Gramm', 'Pack'))
+        self.assertIs(graph.with_overlay({}), graph)
+
+    def test_closure_is_shared_for_identical_edges(self):
+        first = UnitGraph({('g', 'kg'): 0.001})
+        second = UnitGraph({('g', 'kg'): 0.001})
+        self.assertIs(first.closure, second.closure)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from services.webhook import affected_items, FULL_SYNC
+
+
+class TestAffectedItems(unittest.TestCase):
+
+    def test_mealie_item_ids(self):
+        payload = {"event_type": "shopping_list_updated", "document_data": {"shopping_list_item_ids": ["a", "b"]}}
+        self.assertEqual(affected_items(payload), {"a", "b"})
+
+    def test_mealie_item_objects(self):
+        payload = {"documentData": {"shoppingListItemIds": [{"id": "a"}, {"id": "b"}]}}
+        self.assertEqual(affected_items(payload), {"a", "b"})
+
+    def test_mealie_apprise_json_document(self):
+        payload = {"event_type": "shopping_list_updated", "document_data": '{"shopping_list_item_ids": ["a"]}'}
+        self.assertEqual(affected_items(payload), {"a"})
+
+    def test_unexpected_shapes_sync_everything(self):
+        self.assertEqual(affected_items([1, 2]), {FULL_SYNC})
+        self.assertEqual(affected_items("event"), {FULL_SYNC})
+        self.assertEqual(affected_items({"document_data": "not json"}), {FULL_SYNC})
+        self.assertEqual(affected_items({"document_data": "[1, 2]"}), {FULL_SYNC})
+        self.assertEqual(affected_items({"document_data": {"shopping_list_item_ids": "a"}}), {FULL_SYNC})
+        self.assertEqual(affected_items({"document_data": {"shopping_list_item_ids": [{"name": "a"}]}}), {FULL_SYNC})
+
+    def test_other_events_sync_everything(self):
+        self.assertEqual(affected_items({"event": "stock_changed"}), {FULL_SYNC})
+        self.assertEqual(affected_items({"document_data": {"shopping_list_id": "x"}}), {FULL_SYNC})
+        self.assertEqual(affected_items(None), {FULL_SYNC})
+
+
+if __name__ == '__main__':
+    unittest.main()